@@ -39,33 +39,55 @@ const ChatWidget = () => {
     setInput("")
     setLoading(true)
 
+    const botId = messages.length + 2
+    const updateBot = (content: string) =>
+      setMessages(prev => prev.map(m => (m.id === botId ? { ...m, content } : m)))
+
+    setMessages(prev => [...prev, { id: botId, content: "…", sender: "bot", timestamp: new Date() }])
+
     try {
-      const res = await fetch("http://localhost:8000/chat", {
+      // Server-sent events from /chat/stream: "status" updates, then "token" chunks
+      const res = await fetch("http://localhost:8000/chat/stream", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
         body: JSON.stringify({ message: userMsg.content }),
       })
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`)
+
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ""
+      let answer = ""
+      let finished = false
 
-      const data = await res.json()
+      while (true) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
 
-      const botMsg: Message = {
-        id: messages.length + 2,
-        content: data.response.trim(),
-        sender: "bot",
-        timestamp: new Date(),
+        const events = buffer.split("\n\n")
+        buffer = events.pop() ?? ""
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1]
+          const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] ?? "{}")
+          if (event === "status" && !answer) {
+            updateBot(`⏳ ${data.message}…`)
+          } else if (event === "token") {
+            answer += data.content
+            updateBot(answer)
+          } else if (event === "done") {
+            finished = true
+          } else if (event === "error") {
+            throw new Error(data.error)
+          }
+        }
       }
 
-      setMessages(prev => [...prev, botMsg])
+      // A stream that ends without "done" was cut off
+      if (!finished) throw new Error("Stream ended before the answer was complete")
+      updateBot(answer.trim())
     } catch (err) {
-      setMessages(prev => [
-        ...prev,
-        {
-          id: messages.length + 2,
-          content: "⚠️ Failed to reach the AI backend.",
-          sender: "bot",
-          timestamp: new Date(),
-        },
-      ])
+      updateBot("⚠️ Failed to reach the AI backend.")
     } finally {
       setLoading(false)
     }
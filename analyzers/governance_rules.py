@@ -0,0 +1,262 @@
+import os
+import re
+import threading
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+# The numeric governance rules are plain arithmetic, so they are evaluated
+# here instead of being left for the LLM to work out from the policy text.
+# Thresholds are parsed from governance.txt (editing a number there changes
+# the check); a rule whose sentence isn't found keeps its default.
+#
+# Records are turned into columns once, then each rule runs over whole
+# columns, so one pass covers every project in the data.
+
+DEFAULT_THRESHOLDS = {
+    "escalation_max_hours": 4.0,
+    "overburn_burn_pct": 80.0,
+    "overburn_progress_pct": 50.0,
+    "red_sentiment_run": 2,
+    "red_sentiment_below": 6.0,
+}
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+_RULE_PATTERNS = [
+    (re.compile(rf"responded to within {_NUMBER} working hours", re.I),
+     ("escalation_max_hours",)),
+    (re.compile(rf"burn rate above {_NUMBER}% before {_NUMBER}% project progress", re.I),
+     ("overburn_burn_pct", "overburn_progress_pct")),
+    (re.compile(rf"{_NUMBER} or more consecutive communication scores fall below {_NUMBER}", re.I),
+     ("red_sentiment_run", "red_sentiment_below")),
+]
+
+# Column names seen in the sheets and in Firebase emailLogs, first match wins
+FIELD_ALIASES = {
+    "project": ("Project Name", "Project", "projectName", "project"),
+    "date": ("Date", "date", "Timestamp", "timestamp"),
+    "burn": ("Burn Rate", "Burn %", "burnRate", "burn_rate"),
+    "progress": ("Progress", "Project Progress", "% Complete", "progress"),
+    "sentiment": ("Sentiment Score", "sentimentScore", "sentiment_score", "Sentiment"),
+    "escalated_at": ("Escalated At", "Escalation Time", "escalatedAt"),
+    "responded_at": ("Responded At", "Response Time", "respondedAt"),
+    "response_hours": ("Response Hours", "responseHours"),
+}
+
+WORKDAY_START = time(9)
+WORKDAY_END = time(18)
+# Working hours are counted on this zone's wall clock. Timestamps with an
+# offset are converted to it; naive ones are taken to be in it already.
+BUSINESS_TIMEZONE = ZoneInfo(os.getenv("GOVERNANCE_TIMEZONE", "UTC"))
+
+# Open escalations are measured up to an explicit evaluation time. Snapshot
+# results use the current time floored to this step, so they are cacheable and
+# reproducible, and still pick up an escalation crossing the limit within a step.
+RULE_CLOCK_STEP = int(os.getenv("GOVERNANCE_CLOCK_STEP", "900"))  # seconds
+
+
+def parse_thresholds(governance_text: str) -> dict:
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for pattern, names in _RULE_PATTERNS:
+        match = pattern.search(governance_text)
+        if match:
+            for name, value in zip(names, match.groups()):
+                thresholds[name] = type(DEFAULT_THRESHOLDS[name])(float(value))
+    return thresholds
+
+
+def _first(row, names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _number(value):
+    if value is None:
+        return None
+    try:
+        return float(str(value).strip().rstrip("%").replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _percent(value):
+    """Percentage from "85%", "85" or a decimal fraction such as 0.85.
+
+    Only values written with a decimal point are read as fractions, so a
+    bare "1" stays 1% while "1.0" is 100%.
+    """
+    number = _number(value)
+    text = str(value)
+    if number is not None and "%" not in text and "." in text and 0 < number <= 1:
+        number *= 100
+    return number
+
+
+def parse_time(value):
+    """Naive business-timezone datetime of an ISO timestamp, or None"""
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(BUSINESS_TIMEZONE).replace(tzinfo=None)
+    return parsed
+
+
+def to_columns(records: list) -> dict:
+    """Parsed column lists for the fields the rules use; missing values are None"""
+    rows = [r if isinstance(r, dict) else {} for r in records]
+    raw = {field: [_first(row, names) for row in rows] for field, names in FIELD_ALIASES.items()}
+    return {
+        "project": [str(v).strip() if v is not None else "" for v in raw["project"]],
+        "date": [str(v) if v is not None else "" for v in raw["date"]],
+        "burn": [_percent(v) for v in raw["burn"]],
+        "progress": [_percent(v) for v in raw["progress"]],
+        "sentiment": [_number(v) for v in raw["sentiment"]],
+        "escalated_at": [parse_time(v) for v in raw["escalated_at"]],
+        "responded_at": [parse_time(v) for v in raw["responded_at"]],
+        "response_hours": [_number(v) for v in raw["response_hours"]],
+    }
+
+
+def working_hours_between(start: datetime, end: datetime) -> float:
+    """Hours between two times that fall inside Mon-Fri working hours"""
+    total, day = 0.0, start.date()
+    while day <= end.date():
+        if day.weekday() < 5:
+            lo = max(start, datetime.combine(day, WORKDAY_START))
+            hi = min(end, datetime.combine(day, WORKDAY_END))
+            if hi > lo:
+                total += (hi - lo).total_seconds() / 3600
+        day += timedelta(days=1)
+    return total
+
+
+def _overburn(cols, t, now):
+    limit, before = t["overburn_burn_pct"], t["overburn_progress_pct"]
+    return [
+        (i, [i], f"Burn rate {burn:g}% at {progress:g}% progress (limit {limit:g}% before {before:g}% progress)")
+        for i, (burn, progress) in enumerate(zip(cols["burn"], cols["progress"]))
+        if burn is not None and progress is not None and burn > limit and progress < before
+    ]
+
+
+def _red_sentiment(cols, t, now):
+    run_length, below = t["red_sentiment_run"], t["red_sentiment_below"]
+    scored = [i for i, score in enumerate(cols["sentiment"]) if score is not None]
+    # Consecutive means consecutive within a project, in date order
+    scored.sort(key=lambda i: (cols["project"][i].lower(), cols["date"][i]))
+
+    found, run, previous = [], [], None
+    for i in scored + [None]:
+        project = cols["project"][i].lower() if i is not None else None
+        if i is None or project != previous or cols["sentiment"][i] >= below:
+            if len(run) >= run_length:
+                scores = ", ".join(f"{cols['sentiment'][j]:g}" for j in run)
+                found.append((run[0], run, f"{len(run)} consecutive sentiment scores below {below:g} ({scores})"))
+            run = []
+        if i is not None and cols["sentiment"][i] < below:
+            run.append(i)
+        previous = project
+    return found
+
+
+def _escalation_response(cols, t, now):
+    limit = t["escalation_max_hours"]
+    found = []
+    for i, (escalated, responded, hours) in enumerate(
+            zip(cols["escalated_at"], cols["responded_at"], cols["response_hours"])):
+        if hours is None and escalated is not None:
+            if responded is None:
+                waited = working_hours_between(escalated, now)
+                if waited > limit:
+                    found.append((i, [i], f"No response after {waited:.1f} working hours (limit {limit:g})"))
+                continue
+            hours = working_hours_between(escalated, responded)
+        if hours is not None and hours > limit:
+            found.append((i, [i], f"Escalation answered after {hours:.1f} working hours (limit {limit:g})"))
+    return found
+
+
+RULES = [
+    ("escalation_response", "Escalation Response", _escalation_response),
+    ("overburn", "Overburn Alert", _overburn),
+    ("red_sentiment", "Red Sentiment", _red_sentiment),
+]
+
+
+def rule_clock(timestamp: float = None) -> datetime:
+    """Evaluation time for `timestamp` (default now), floored to RULE_CLOCK_STEP,
+    as a naive business-timezone datetime like the parsed record times"""
+    timestamp = datetime.now().timestamp() if timestamp is None else timestamp
+    step = max(RULE_CLOCK_STEP, 1)
+    return datetime.fromtimestamp(timestamp // step * step, BUSINESS_TIMEZONE).replace(tzinfo=None)
+
+
+def evaluate(records: list, thresholds: dict = None, ref_format: str = "Row {n}",
+             first_row: int = 1, now: datetime = None) -> list:
+    """Violations of the numeric rules over `records`.
+
+    Each violation has the same keys as an LLM risk item (type, reason,
+    reference, excerpt) plus the rule id, project and every row involved.
+    Row i is referenced as ref_format.format(n=i + first_row). Escalations
+    without a response are measured up to `now` (default: the current time).
+    """
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    now = now or datetime.now(BUSINESS_TIMEZONE).replace(tzinfo=None)
+    cols = to_columns(records)
+
+    def ref(i):
+        return ref_format.format(n=i + first_row)
+
+    violations = []
+    for rule_id, rule_type, check in RULES:
+        for i, rows, reason in check(cols, thresholds, now):
+            violations.append({
+                "rule": rule_id,
+                "type": rule_type,
+                "project": cols["project"][i],
+                "reason": reason,
+                "reference": ref(i),
+                "rows": [ref(j) for j in rows],
+                "excerpt": "",
+            })
+    return violations
+
+
+def format_facts(violations: list) -> str:
+    """One line per violation, for the LLM prompt"""
+    return "\n".join(
+        f"- {v['type']} | {v['project'] or 'unknown project'} | {', '.join(v['rows'])} | {v['reason']}"
+        for v in violations
+    )
+
+
+_snapshot_result = None
+_snapshot_lock = threading.Lock()
+
+
+def evaluate_snapshot(snapshot: dict, thresholds: dict, tab_names: dict, as_of: datetime) -> list:
+    """Violations across every sheet tab as of `as_of` (see rule_clock),
+    computed once per snapshot version and evaluation time.
+
+    Rows are referenced by tab and spreadsheet row number (the header is row 1).
+    """
+    global _snapshot_result
+    key = (snapshot["version"], as_of, tuple(sorted(thresholds.items())))
+    with _snapshot_lock:
+        if _snapshot_result is not None and _snapshot_result[0] == key:
+            return _snapshot_result[1]
+
+    violations = []
+    for tab, rows in snapshot["sheets"].items():
+        label = tab_names.get(tab, tab)
+        violations.extend(evaluate(rows, thresholds, ref_format=label + " row {n}", first_row=2, now=as_of))
+
+    with _snapshot_lock:
+        _snapshot_result = (key, violations)
+    return violations
@@ -1,21 +1,61 @@
-def prompt_llm_with_email_data(email_data: list[str]) -> dict:
-    import subprocess
-    import json
+import os
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import requests
+from requests.adapters import HTTPAdapter
+from token_utils import count_tokens
+from metrics import inc, span
+from analyzers.governance_rules import evaluate, format_facts, parse_thresholds
+
+# Local inference server (Ollama). The model stays loaded between calls
+# instead of being cold-started by a new `ollama run` process each time.
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+
+# Email rows per prompt are capped by tokens so a chunk always fits the
+# model's context window alongside the instructions and governance rules.
+CHUNK_TOKEN_BUDGET = int(os.getenv("RISK_LLM_CHUNK_TOKENS", "3000"))
+# Precomputed rule violations shown per chunk are capped so the email rows
+# always keep at least CHUNK_TOKEN_BUDGET - overhead - RULE_FACTS_TOKENS
+RULE_FACTS_TOKENS = int(os.getenv("RISK_LLM_FACT_TOKENS", str(CHUNK_TOKEN_BUDGET // 5)))
+MAX_CONCURRENCY = int(os.getenv("RISK_LLM_CONCURRENCY", "4"))
+
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY))
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY))
 
-    # Load governance rules
+
+@lru_cache(maxsize=1)
+def load_governance_rules() -> str:
     with open("governance.txt", "r") as f:
-        governance_rules = f.read()
+        return f.read()
+
+
+@lru_cache(maxsize=1)
+def load_governance_thresholds() -> dict:
+    return parse_thresholds(load_governance_rules())
 
-    # Combine prompt
-    full_prompt = f"""
+
+def build_prompt(governance_rules: str, email_chunk: str, rule_facts: str = "") -> str:
+    return f"""
 You are an AI assistant trained to assess project risk and governance compliance.
 You MUST strictly follow the organization's governance policies provided below.
 
 === Governance Rules ===
 {governance_rules}
 
+=== Precomputed Rule Checks ===
+Escalation response times, burn rate and sentiment score runs were already checked
+exactly against the rules above. Treat these results as facts, do not recompute or
+repeat them, and use them as context for the remaining rules.
+{rule_facts or "No violations of these rules were found in these rows."}
+
 === Project Communication Data ===
-{email_data}
+{email_chunk}
 
 Based on the above, analyze scope creep, escalation risk, timeline delays, sentiment issues, and non-compliance.
 Respond in structured JSON like this:
@@ -33,22 +73,125 @@ Respond in structured JSON like this:
 }}
 """
 
-    # Run LLM (Mistral via Ollama)
-    process = subprocess.Popen(["ollama", "run", "mistral"],
-                               stdin=subprocess.PIPE,
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE)
 
-    stdout, stderr = process.communicate(full_prompt.encode())
-    decoded = stdout.decode("utf-8")
+def chunk_email_data(email_data: list, budget: int) -> list:
+    """Greedily pack rows into chunks of at most `budget` tokens.
+
+    Returns (first row, last row, text) per chunk. Rows keep their global
+    "Row N" label so references stay valid after the per-chunk results are
+    merged. A single row larger than the budget becomes its own chunk.
+    """
+    chunks, current, used, first = [], [], 0, 1
+    for n, item in enumerate(email_data, start=1):
+        line = f"Row {n}: {item}"
+        tokens = count_tokens(line)
+        if current and used + tokens > budget:
+            chunks.append((first, n - 1, "\n".join(current)))
+            current, used, first = [], 0, n
+        current.append(line)
+        used += tokens
+    if current:
+        chunks.append((first, len(email_data), "\n".join(current)))
+    return chunks
+
+
+def chunk_rule_facts(violations: list, first: int, last: int, budget: int) -> str:
+    """Rule violations involving rows first..last, cut to `budget` tokens.
+
+    Violations that don't fit are summarized as counts per rule type.
+    """
+    rows = {f"Row {n}" for n in range(first, last + 1)}
+    relevant = [v for v in violations if rows.intersection(v["rows"])]
+    lines, used = [], 0
+    for i, violation in enumerate(relevant):
+        line = format_facts([violation])
+        tokens = count_tokens(line) + 1
+        if used + tokens > budget:
+            counts = Counter(v["type"] for v in relevant[i:])
+            lines.append(f"- ...and {len(relevant) - i} more: " + ", ".join(f"{n} {t}" for t, n in counts.items()))
+            break
+        lines.append(line)
+        used += tokens
+    return "\n".join(lines)
+
+
+def run_llm(prompt: str) -> str:
+    inc("upstream_requests_total", upstream="ollama")
+    response = _session.post(
+        f"{OLLAMA_URL}/api/generate",
+        json={
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": False,
+            "format": "json",
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+        },
+        timeout=OLLAMA_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json().get("response", "")
+
+
+def analyze_chunk(prompt: str) -> list:
+    try:
+        with span("risk_chunk"):
+            decoded = run_llm(prompt)
+    except requests.exceptions.RequestException as e:
+        return [{"type": "LLM Error", "reason": str(e)}]
 
     # Extract only the JSON from the response
     try:
         parsed = json.loads(decoded.strip())
         if "risk_analysis" in parsed:
-            return parsed
+            return parsed["risk_analysis"]
         else:
-            return {"risk_analysis": [{"type": "Unknown", "reason": "Could not parse LLM response"}]}
+            return [{"type": "Unknown", "reason": "Could not parse LLM response"}]
     except Exception:
-        return {"risk_analysis": [{"type": "Parse Error", "reason": decoded}]}
+        return [{"type": "Parse Error", "reason": decoded}]
+
+
+def merge_risk_items(per_chunk: list) -> list:
+    """Concatenate per-chunk findings, dropping duplicates of the same risk"""
+    merged, seen = [], set()
+    for items in per_chunk:
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            key = (
+                str(item.get("type", "")).strip().lower(),
+                str(item.get("reference", "")).strip().lower(),
+                " ".join(str(item.get("reason", "")).lower().split()),
+            )
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(item)
+    return merged
+
+
+def prompt_llm_with_email_data(email_data: list[str]) -> dict:
+    governance_rules = load_governance_rules()
+    # Numeric rules are evaluated exactly over all rows (same "Row N" labels
+    # as the chunks) and handed to the model as facts
+    with span("governance_rules"):
+        violations = evaluate(email_data, load_governance_thresholds())
+
+    # Each chunk only sees the violations among its own rows
+    overhead = count_tokens(build_prompt(governance_rules, "")) + RULE_FACTS_TOKENS
+    chunks = chunk_email_data(email_data, max(CHUNK_TOKEN_BUDGET - overhead, 1))
+    inc("rows_scanned_total", len(email_data), stage="risk_analysis")
+    prompts = [
+        build_prompt(governance_rules, text, chunk_rule_facts(violations, first, last, RULE_FACTS_TOKENS))
+        for first, last, text in chunks
+    ] or [build_prompt(governance_rules, "")]
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as pool:
+        per_chunk = list(pool.map(analyze_chunk, prompts))
+
+    return {"risk_analysis": merge_risk_items([violations] + per_chunk), "rule_violations": violations}
+
 
+def analyze_project(project_name: str) -> dict:
+    """Risk analysis over a project's email logs from the local Firebase mirror"""
+    from fetchers.firebase import query_email_logs
+    return prompt_llm_with_email_data(query_email_logs(project_name))
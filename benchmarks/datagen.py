@@ -0,0 +1,89 @@
+"""Synthetic sheet, scope-doc and email-log data shaped like the real tabs"""
+import random
+from datetime import date, timedelta
+
+INDEX_HEADERS = ["Project Name", "BU", "Solution Center", "Date", "Status"]
+EMAIL_HEADERS = ["Email Record ID", "Date", "From", "Subject", "Body", "Project Name", "Project", "Mode", "Insights"]
+
+_SUBJECTS = ["Weekly status", "Change request", "Sprint review", "Escalation", "UAT feedback", "Invoice query"]
+_INSIGHTS = [
+    "On track", "Client requested a new report, not in scope", "Delay in API delivery",
+    "Change approved by Delivery Head", "Blocked on client data", "Phase 2 acknowledged",
+    "Milestone completed and signed off", "Issue escalated to account manager", "Sentiment positive",
+]
+_WORDS = ("module flow dashboard integration timeline deliverable payment approval sprint release "
+          "migration report feature budget resource testing login mobile portal workflow").split()
+
+
+def project_names(count):
+    return [f"Project {i:05d}" for i in range(count)]
+
+
+def _sentence(rng, words=20):
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def sheet_tabs(rows, projects, seed=7):
+    """Sheets `values` for the Index, Email Extractor and Email Manager tabs.
+
+    `rows` email rows are split evenly between the two email tabs; the Index
+    tab holds one row per project.
+    """
+    rng = random.Random(seed)
+    names = project_names(projects)
+    start = date(2023, 1, 1)
+
+    index = [INDEX_HEADERS] + [
+        [name, f"BU-{i % 12}", f"SC-{i % 5}", (start + timedelta(days=i % 365)).isoformat(), rng.choice(["Green", "Amber", "Red"])]
+        for i, name in enumerate(names)
+    ]
+
+    def email_tab(count, prefix):
+        values = [EMAIL_HEADERS]
+        for i in range(count):
+            name = rng.choice(names)
+            values.append([
+                f"{prefix}-{i}",
+                (start + timedelta(days=rng.randrange(730))).isoformat(),
+                f"user{rng.randrange(500)}@client.example",
+                rng.choice(_SUBJECTS),
+                _sentence(rng, rng.randint(10, 60)),
+                name,
+                name,
+                rng.choice(["Email", "Call", "Meeting"]),
+                rng.choice(_INSIGHTS),
+            ])
+        return values
+
+    return {
+        "Index": index,
+        "Email Extractor": email_tab(rows // 2, "EX"),
+        "Email Manager": email_tab(rows - rows // 2, "EM"),
+    }
+
+
+def scope_docs(projects, seed=7):
+    """(Drive file list, {doc id: text}) with one scope doc per project"""
+    rng = random.Random(seed)
+    files, texts = [], {}
+    for i, name in enumerate(project_names(projects)):
+        doc_id = f"doc-{i}"
+        files.append({"id": doc_id, "name": f"{name} Scope Document", "modifiedTime": "2024-01-01T00:00:00Z"})
+        texts[doc_id] = "\n".join(_sentence(rng, 25) for _ in range(30))
+    return files, texts
+
+
+def email_logs(count, projects, seed=7):
+    """Firebase emailLogs tree keyed by push-id-like, lexicographically ordered keys"""
+    rng = random.Random(seed)
+    names = project_names(projects)
+    return {
+        f"-N{i:012d}": {
+            "Project Name": rng.choice(names),
+            "From": f"user{rng.randrange(500)}@client.example",
+            "Subject": rng.choice(_SUBJECTS),
+            "Body": _sentence(rng, rng.randint(10, 60)),
+            "sentimentScore": rng.randint(1, 10),
+        }
+        for i in range(count)
+    }
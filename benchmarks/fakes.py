@@ -0,0 +1,220 @@
+"""Local stand-ins for every upstream the service talks to.
+
+- Groq chat completions, Firebase Realtime Database REST and the Ollama
+  generate API run as real HTTP servers on 127.0.0.1, so the pooled clients,
+  streaming and pagination code paths are exercised end to end.
+- Sheets, Drive and Docs are injectable stubs shaped like googleapiclient
+  resources (`...execute()`), assigned to sheets_utils.service and
+  google_docs_utils.drive_service / docs_service.
+
+Every fake takes a latency in seconds; the HTTP fakes can also answer a
+fraction of requests with 429 to exercise rate-limit handling.
+"""
+import json
+import random
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeServer:
+    """Threaded HTTP server running a handler class in the background"""
+
+    def __init__(self, handler_cls, latency=0.0, error_rate=0.0, **state):
+        handler = type(handler_cls.__name__, (handler_cls,), {
+            "latency": latency, "error_rate": error_rate, "state": state
+        })
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.handler = handler
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    @property
+    def requests(self):
+        return self.handler.requests
+
+    def __enter__(self):
+        self.handler.requests = 0
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    error_rate = 0.0
+    state = {}
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _begin(self):
+        type(self).requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self._send_json({"error": {"message": "Rate limit reached"}}, status=429,
+                            headers={"Retry-After": "1", "X-RateLimit-Remaining-Requests": "0"})
+            return False
+        return True
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, data, status=200, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GroqHandler(_Handler):
+    """OpenAI-compatible /chat/completions, plain or `stream: true` (SSE)"""
+
+    def do_POST(self):
+        payload = self._read_json()
+        if not self._begin():
+            return
+        answer = self.state.get("answer", "Synthetic answer: no scope creep detected for this project.")
+
+        if not payload.get("stream"):
+            self._send_json({"choices": [{"message": {"role": "assistant", "content": answer}}]},
+                            headers={"X-RateLimit-Remaining-Requests": "1000"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in answer.split(" "):
+            self._write_chunk("data: %s\n\n" % json.dumps({"choices": [{"delta": {"content": word + " "}}]}))
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+class FirebaseHandler(_Handler):
+    """GET /emailLogs.json with orderBy="$key", startAt and limitToFirst"""
+
+    def do_GET(self):
+        if not self._begin():
+            return
+        tree = self.state["tree"]
+        query = {k: json.loads(v[0]) for k, v in parse_qs(urlparse(self.path).query).items()}
+        keys = self.state.setdefault("sorted_keys", sorted(tree))
+        if "startAt" in query:
+            keys = keys[bisect_left(keys, query["startAt"]):]
+        if "limitToFirst" in query:
+            keys = keys[:query["limitToFirst"]]
+        self._send_json({k: tree[k] for k in keys} if keys else None)
+
+
+class OllamaHandler(_Handler):
+    """POST /api/generate returning a risk_analysis JSON document"""
+
+    def do_POST(self):
+        payload = self._read_json()
+        if not self._begin():
+            return
+        rows = payload.get("prompt", "").count("\nRow ")
+        analysis = {"risk_analysis": [
+            {"type": "Scope Creep", "reason": "New feature requested", "reference": "Row 1", "excerpt": "..."},
+            {"type": "Timeline Delay", "reason": f"{rows} rows reviewed", "reference": "Row 2", "excerpt": "..."},
+        ]}
+        self._send_json({"model": payload.get("model"), "response": json.dumps(analysis), "done": True})
+
+
+class _Request:
+    def __init__(self, latency, result):
+        self.latency = latency
+        self.result = result
+
+    def execute(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.result
+
+
+class FakeSheetsService:
+    """spreadsheets().values().get / batchGet over {tab name: values}"""
+
+    def __init__(self, tabs, latency=0.0):
+        self.tabs = tabs
+        self.latency = latency
+        self.calls = 0
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range):
+        self.calls += 1
+        return _Request(self.latency, {"range": range, "values": self.tabs.get(range, [])})
+
+    def batchGet(self, spreadsheetId, ranges):
+        self.calls += 1
+        return _Request(self.latency, {"valueRanges": [
+            {"range": r, "values": self.tabs.get(r, [])} for r in ranges
+        ]})
+
+
+class FakeDriveService:
+    """files().list over a fixed list of {id, name, modifiedTime}"""
+
+    def __init__(self, files, latency=0.0):
+        self._files = files
+        self.latency = latency
+        self.calls = 0
+
+    def files(self):
+        return self
+
+    def list(self, q=None, fields=None, pageSize=100, pageToken=None):
+        self.calls += 1
+        start = int(pageToken or 0)
+        page = self._files[start:start + pageSize]
+        result = {"files": page}
+        if start + pageSize < len(self._files):
+            result["nextPageToken"] = str(start + pageSize)
+        return _Request(self.latency, result)
+
+
+class FakeDocsService:
+    """documents().get returning a Docs body built from plain text paragraphs"""
+
+    def __init__(self, texts, latency=0.0):
+        self.texts = texts
+        self.latency = latency
+        self.calls = 0
+
+    def documents(self):
+        return self
+
+    def get(self, documentId):
+        self.calls += 1
+        paragraphs = self.texts.get(documentId, "").split("\n")
+        return _Request(self.latency, {"body": {"content": [
+            {"paragraph": {"elements": [{"textRun": {"content": p + "\n"}}]}} for p in paragraphs
+        ]}})
@@ -0,0 +1,211 @@
+"""Offline benchmark harness.
+
+Runs the API in-process against local fakes (see benchmarks/fakes.py) and
+reports throughput, p50/p95/p99 latency and peak RSS per scenario:
+
+    python -m benchmarks.run --rows 100000 --projects 2000 --requests 500 \
+        --concurrency 50 --latency 0.05 --scenarios chat,summary,pdf,risk
+
+Run from the repository root. Upstream latency applies to every fake; use
+--groq-latency etc. to override one upstream.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks import datagen
+from benchmarks.fakes import (
+    FakeDocsService, FakeDriveService, FakeServer, FakeSheetsService,
+    FirebaseHandler, GroqHandler, OllamaHandler,
+)
+
+SCENARIOS = ["chat", "summary", "pdf", "risk"]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+async def measure(name, call, requests, concurrency):
+    """Run `call(i)` `requests` times with bounded concurrency; first call is reported as cold"""
+    start = time.perf_counter()
+    await call(-1)
+    cold = time.perf_counter() - start
+
+    latencies, errors = [], 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        async with gate:
+            t0 = time.perf_counter()
+            try:
+                await call(i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": requests,
+        "errors": errors,
+        "cold_ms": cold * 1000,
+        "throughput_rps": requests / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def configure_environment(args, groq, firebase, ollama, workdir):
+    os.environ.update({
+        "GROQ_API_URL": f"{groq.url}/openai/v1/chat/completions",
+        "GROQ_API_KEY": "benchmark",
+        "GOOGLE_DOCS_FOLDER_ID": "benchmark",
+        "FIREBASE_DB_URL": firebase.url,
+        "OLLAMA_URL": ollama.url,
+        "SCOPE_CACHE_PATH": os.path.join(workdir, "scope_docs.sqlite"),
+        "EMAIL_LOG_STORE": os.path.join(workdir, "email_logs.sqlite"),
+        "SHEETS_SNAPSHOT_DIR": os.path.join(workdir, "sheets"),
+        "DIGEST_STORE": os.path.join(workdir, "digests.sqlite"),
+        # Scans are measured on their own, not mixed into request latencies
+        "DIGEST_INTERVAL": "0",
+        # The fakes have no quota; Groq limits come from its headers and 429s
+        "SHEETS_REQUESTS_PER_MINUTE": "0",
+        "DRIVE_REQUESTS_PER_MINUTE": "0",
+        "DOCS_REQUESTS_PER_MINUTE": "0",
+        "SHEETS_CACHE_TTL": "3600",
+    })
+    if args.no_llm_cache:
+        os.environ["LLM_CACHE_SIZE"] = "0"
+
+
+async def run_scenarios(args, tabs, files, texts):
+    # Imported only now: modules read their upstream URLs from the environment
+    import httpx
+    import sheets_utils
+    import google_docs_utils
+
+    sheets_utils.service = FakeSheetsService(tabs, latency=args.sheets_latency)
+    google_docs_utils.drive_service = FakeDriveService(files, latency=args.drive_latency)
+    google_docs_utils.docs_service = FakeDocsService(texts, latency=args.drive_latency)
+
+    import main
+    from analyzers import risk_llm
+    from fetchers import firebase
+
+    projects = datagen.project_names(args.projects)
+    rng = random.Random(11)
+    results = []
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def chat(i):
+                message = f"What is the scope creep status for {rng.choice(projects)}?"
+                response = await client.post("/chat", json={"message": message})
+                if "error" in response.json():
+                    raise RuntimeError(response.json()["error"])
+
+            async def summary(i):
+                (await client.get("/risk-report/scope-creep/summary")).raise_for_status()
+
+            async def pdf(i):
+                (await client.get("/risk-report/scope-creep/pdf")).raise_for_status()
+
+            async def risk(i):
+                if i < 0:
+                    await asyncio.to_thread(firebase.sync_email_logs)
+                    return
+                await asyncio.to_thread(risk_llm.analyze_project, rng.choice(projects))
+
+            calls = {"chat": chat, "summary": summary, "pdf": pdf, "risk": risk}
+            for name in args.scenarios:
+                results.append(await measure(name, calls[name], args.requests, args.concurrency))
+    return results
+
+
+def print_table(results):
+    columns = ["scenario", "requests", "errors", "cold_ms", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"]
+    print("  ".join(f"{c:>14}" for c in columns))
+    for r in results:
+        print("  ".join(f"{r[c]:>14.1f}" if isinstance(r[c], float) else f"{r[c]:>14}" for c in columns))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against local upstream fakes")
+    parser.add_argument("--rows", type=int, default=10000, help="email rows across both email tabs")
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--email-logs", type=int, default=10000, help="Firebase emailLogs entries")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="default latency of every upstream (s)")
+    parser.add_argument("--sheets-latency", type=float)
+    parser.add_argument("--drive-latency", type=float)
+    parser.add_argument("--groq-latency", type=float)
+    parser.add_argument("--firebase-latency", type=float)
+    parser.add_argument("--ollama-latency", type=float)
+    parser.add_argument("--groq-429-rate", type=float, default=0.0, help="fraction of Groq calls answered with 429")
+    parser.add_argument("--no-llm-cache", action="store_true", help="disable the LLM response cache")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    for upstream in ("sheets", "drive", "groq", "firebase", "ollama"):
+        attr = f"{upstream}_latency"
+        if getattr(args, attr) is None:
+            setattr(args, attr, args.latency)
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    tabs = datagen.sheet_tabs(args.rows, args.projects)
+    files, texts = datagen.scope_docs(args.projects)
+    tree = datagen.email_logs(args.email_logs, args.projects)
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeServer(GroqHandler, latency=args.groq_latency, error_rate=args.groq_429_rate) as groq, \
+            FakeServer(FirebaseHandler, latency=args.firebase_latency, tree=tree) as firebase, \
+            FakeServer(OllamaHandler, latency=args.ollama_latency) as ollama:
+        configure_environment(args, groq, firebase, ollama, workdir)
+        results = asyncio.run(run_scenarios(args, tabs, files, texts))
+        for r in results:
+            r["upstream_requests"] = {"groq": groq.requests, "firebase": firebase.requests, "ollama": ollama.requests}
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import math
+import os
+from sheet_index import terms
+from scope_classifier import COMPLETED, CONCERN, CORRECTIVE, SIGNAL
+from token_utils import count_tokens
+from metrics import inc, span
+
+# Token budget for the /chat system prompt (instructions + packed context).
+# llama3-8b has an 8k window; the rest is left for the question and answer.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKENS", "4000"))
+# How many of each tab's newest rows per project are considered at all
+CANDIDATES_PER_TAB = int(os.getenv("CHAT_CANDIDATES_PER_TAB", "200"))
+
+SOURCES = [("index", "Index"), ("extractor", "Email Extractor"), ("manager", "Email Manager")]
+# Rendered first, in this order; any other non-empty column follows
+ROW_FIELDS = ["Date", "From", "Subject", "Insights", "Body"]
+SKIP_FIELDS = {"Project Name", "Project", "Email Record ID"}
+BODY_CHARS = 400
+
+# BM25 parameters and score bonuses layered on top of it
+K1, B = 1.2, 0.75
+RECENCY_WEIGHT = 1.0
+FLAG_BONUS = {CONCERN: 1.0, COMPLETED: 0.5, SIGNAL: 1.0, CORRECTIVE: 0.5}
+SCOPE_DOC_BONUS = 2.0
+DIGEST_RISK_BONUS = 2.0
+
+
+def bm25(query_terms, doc_terms, df, docs, avg_len):
+    if not query_terms or not doc_terms:
+        return 0.0
+    counts = {}
+    for term in doc_terms:
+        counts[term] = counts.get(term, 0) + 1
+    norm = K1 * (1 - B + B * len(doc_terms) / (avg_len or 1))
+    score = 0.0
+    for term in query_terms:
+        tf = counts.get(term)
+        if tf:
+            idf = math.log(1 + (docs - df.get(term, 0) + 0.5) / (df.get(term, 0) + 0.5))
+            score += idf * tf * (K1 + 1) / (tf + norm)
+    return score
+
+
+def render_row(row, flags):
+    """One line per row: non-empty fields joined with ' | ', long bodies clipped"""
+    parts = []
+    fields = ROW_FIELDS + [f for f in row if f not in SKIP_FIELDS and f not in ROW_FIELDS]
+    for field in fields:
+        value = " ".join(str(row.get(field, "")).split())
+        if not value:
+            continue
+        if field == "Body" and len(value) > BODY_CHARS:
+            value = value[:BODY_CHARS] + "…"
+        parts.append(f"{field}: {value}")
+    marker = "⚠️ " if flags & CONCERN else "✅ " if flags & COMPLETED else ""
+    return "- " + marker + " | ".join(parts)
+
+
+def build_context(index, report, project_names, doc_context, message, header="", budget=CONTEXT_TOKEN_BUDGET,
+                  digests=()):
+    """Rank candidate rows and scope-doc passages against the message and pack
+    the best ones, rendered compactly, into the token budget.
+
+    Candidates are the newest rows of the matched projects in each tab, the
+    paragraphs of the scope doc summary and the risk items of precomputed
+    digests, given as (project, summary line, item lines); digest summaries
+    go first and are kept whenever they fit. Each gets a BM25 score against
+    the message (snapshot-wide term statistics) plus small bonuses for recency
+    and for concern / milestone / scope-creep flags. Items are taken greedily
+    by score while they fit and are emitted grouped by source, newest first.
+    """
+    with span("context"):
+        context, tokens = _build_context(index, report, project_names, doc_context, message, header, budget, digests)
+    inc("chat_context_chars_total", len(context))
+    inc("chat_context_tokens_total", tokens)
+    return context
+
+
+def _build_context(index, report, project_names, doc_context, message, header, budget, digests):
+    df, docs, avg_len = index.term_stats()
+    query_terms = list(dict.fromkeys(terms(message.lower())))
+
+    # (score, section, order, text); digests take the first sections
+    candidates = []
+    for section, (_, summary, items) in enumerate(digests):
+        candidates.append((math.inf, section, -1, summary))
+        for order, item in enumerate(items):
+            score = bm25(query_terms, terms(item.lower()), df, docs, avg_len) + DIGEST_RISK_BONUS / (1 + order)
+            candidates.append((score, section, order, item))
+
+    doc_section = len(digests)
+    passages = [p.strip() for p in doc_context.split("\n\n") if p.strip()] if doc_context else []
+    for order, passage in enumerate(passages):
+        score = bm25(query_terms, terms(passage.lower()), df, docs, avg_len) + SCOPE_DOC_BONUS / (1 + order)
+        candidates.append((score, doc_section, order, passage))
+
+    for section, (key, _) in enumerate(SOURCES, start=doc_section + 1):
+        rows, texts, flags = index.rows[key], index.texts[key], report.flags[key]
+        for order, i in enumerate(index.project_row_ids(key, project_names, limit=CANDIDATES_PER_TAB)):
+            score = bm25(query_terms, terms(texts[i]), df, docs, avg_len)
+            score += RECENCY_WEIGHT / (1 + order)
+            score += sum(bonus for flag, bonus in FLAG_BONUS.items() if flags[i] & flag)
+            candidates.append((score, section, order, render_row(rows[i], flags[i])))
+    inc("rows_scanned_total", len(candidates) - len(passages) - sum(len(d[2]) + 1 for d in digests), stage="context")
+
+    titles = [f"--- 🗂️ Risk Digest: {project} ---" for project, _, _ in digests]
+    titles.append(f"--- 📄 Scope Document: {project_names[0]} ---" if project_names else "--- 📄 Scope Document ---")
+    titles += [f"--- 📬 {label} ---" for _, label in SOURCES]
+
+    # A section's title is charged along with its first item
+    used = count_tokens(header)
+    selected = []
+    opened = set()
+    for candidate in sorted(candidates, key=lambda c: -c[0]):
+        tokens = count_tokens(candidate[3]) + 1
+        if candidate[1] not in opened:
+            tokens += count_tokens(titles[candidate[1]]) + 2
+        if used + tokens > budget:
+            continue
+        selected.append(candidate)
+        opened.add(candidate[1])
+        used += tokens
+
+    output = []
+    for section, title in enumerate(titles):
+        items = sorted((c for c in selected if c[1] == section), key=lambda c: c[2])
+        if items:
+            output.append(f"{title}\n" + "\n".join(c[3] for c in items) + "\n")
+    return header + "\n".join(output), used
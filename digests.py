@@ -0,0 +1,347 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from sheets_utils import SHEET_NAMES, get_snapshot
+from sheet_index import get_index, normalize_project
+from scope_classifier import COMPLETED, CONCERN, RESOLVED, get_report, scope_creep_status
+from analyzers.governance_rules import evaluate, evaluate_snapshot, rule_clock
+from analyzers.risk_llm import load_governance_thresholds, prompt_llm_with_email_data
+from fetchers.firebase import query_email_logs, sync_email_logs
+from file_lock import file_lock
+from metrics import cache_result, inc, span
+from upstream import run_blocking
+
+# Portfolio scan: every project in the Index tab gets a stored risk digest
+# (scope-creep status, open concerns, completed milestones, risk items). A
+# background task rescans periodically and re-analyzes only projects whose
+# sheet rows or email logs changed since their digest was built, so /chat and
+# the digest endpoints read precomputed results instead of working per request.
+DIGEST_INTERVAL = float(os.getenv("DIGEST_INTERVAL", "900"))  # seconds, 0 disables
+DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", "4"))
+DIGEST_STORE = os.getenv("DIGEST_STORE", os.path.join(".cache", "digests.sqlite"))
+# LLM risk analysis of each project's email logs (needs a reachable Ollama
+# server, see analyzers/risk_llm.py); rule checks always run
+DIGEST_RISK_LLM = os.getenv("DIGEST_RISK_LLM", "0") == "1"
+DIGEST_ITEMS = int(os.getenv("DIGEST_ITEMS", "10"))
+# A project whose analysis failed is retried after a backoff that doubles
+# with each consecutive failure, instead of on every scan
+DIGEST_RETRY_BACKOFF = float(os.getenv("DIGEST_RETRY_BACKOFF", "900"))
+DIGEST_RETRY_MAX = float(os.getenv("DIGEST_RETRY_MAX", "21600"))
+
+EMAIL_TABS = ("extractor", "manager")
+ITEM_FIELDS = ("Date", "Subject", "Insights")
+LLM_FAILURES = {"LLM Error", "Parse Error", "Unknown"}
+
+logger = logging.getLogger("risk_report.digests")
+_local = threading.local()
+
+
+def _store():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(DIGEST_STORE) or ".", exist_ok=True)
+        conn = sqlite3.connect(DIGEST_STORE, timeout=30)
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS project_digests ("
+            " project TEXT PRIMARY KEY, fingerprint TEXT, digest TEXT NOT NULL, updated_at REAL);"
+            "CREATE TABLE IF NOT EXISTS scan_state (name TEXT PRIMARY KEY, value TEXT);"
+        )
+        # Stores created before analysis failures were tracked
+        for column in ("failures INTEGER NOT NULL DEFAULT 0", "retry_at REAL"):
+            try:
+                conn.execute(f"ALTER TABLE project_digests ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass
+        _local.conn = conn
+    return conn
+
+
+def sheet_fingerprint(index, project):
+    """Hash of a project's rows in every tab; changes when any of them does"""
+    name = normalize_project(project)
+    rows = {key: [index.rows[key][i] for i in index.by_project[key].get(name, [])] for key in index.rows}
+    return hashlib.sha1(json.dumps(rows, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def logs_fingerprint(email_logs):
+    return hashlib.sha1(json.dumps([log["key"] for log in email_logs]).encode("utf-8")).hexdigest()[:16]
+
+
+def _item(row, reference):
+    item = {field: row.get(field, "") for field in ITEM_FIELDS}
+    item["reference"] = reference
+    return item
+
+
+def _log_references(items, email_logs):
+    """Point "Row N" references of the analyzer at the email log key"""
+    for item in items:
+        match = re.fullmatch(r"\s*Row (\d+)\s*", str(item.get("reference", "")))
+        if match and 0 < int(match.group(1)) <= len(email_logs):
+            item["reference"] = f"Email log {email_logs[int(match.group(1)) - 1]['key']}"
+    return items
+
+
+def _project_violations(violations, project):
+    name = normalize_project(project)
+    return [v for v in violations if normalize_project(v["project"]) == name]
+
+
+def _log_violations(email_logs, as_of):
+    if not email_logs:
+        return []
+    return evaluate(email_logs, load_governance_thresholds(), ref_format="Email log {n}", now=as_of)
+
+
+def _with_rule_items(digest, sheet_items, log_items, as_of):
+    """Digest with its rule check results replaced by ones evaluated at `as_of`.
+
+    Open escalations depend on the evaluation time, so these are refreshed on
+    every scan and read, while the LLM analysis is only redone when the
+    project's data changes.
+    """
+    digest = dict(digest)
+    digest["sheet_rule_items"] = sheet_items
+    digest["log_rule_items"] = log_items
+    digest["rules_as_of"] = as_of.isoformat()
+    digest["risk_items"] = sheet_items + log_items + digest["analysis_items"]
+    return digest
+
+
+def build_digest(index, report, project, email_logs, sheet_violations, as_of):
+    """Risk digest of one project from the current index, report and email logs"""
+    name = normalize_project(project)
+    index_ids = index.by_project["index"].get(name, [])
+    index_row = index.rows["index"][index_ids[0]] if index_ids else {}
+
+    concerns, milestones = [], []
+    for key in EMAIL_TABS:
+        rows, flags = index.rows[key], report.flags[key]
+        for i in index.by_project[key].get(name, []):
+            reference = f"{SHEET_NAMES[key]} row {i + 2}"
+            if flags[i] & CONCERN and not flags[i] & (RESOLVED | COMPLETED):
+                concerns.append(_item(rows[i], reference))
+            if flags[i] & COMPLETED:
+                milestones.append(_item(rows[i], reference))
+    # Both tabs are newest first already; merge them the same way
+    concerns.sort(key=lambda item: item["Date"], reverse=True)
+    milestones.sort(key=lambda item: item["Date"], reverse=True)
+
+    analysis_items, analysis_error = [], None
+    if email_logs and DIGEST_RISK_LLM:
+        analysis = prompt_llm_with_email_data(email_logs)
+        # Failed chunks are reported once on the digest, never as risk items;
+        # rule violations are kept separately (see _with_rule_items)
+        failed = [item for item in analysis["risk_analysis"] if item.get("type") in LLM_FAILURES]
+        if failed:
+            analysis_error = f"{failed[0]['type']}: {str(failed[0].get('reason', ''))[:300]}"
+        analysis_items = _log_references([
+            item for item in analysis["risk_analysis"]
+            if item.get("type") not in LLM_FAILURES and "rule" not in item
+        ], email_logs)
+
+    digest = {
+        "project": index_row.get("Project Name", project),
+        "bu": index_row.get("BU", ""),
+        "scope_creep_status": scope_creep_status(report.flags["index"][index_ids[0]]) if index_ids else "TBD",
+        "open_concerns": concerns[:DIGEST_ITEMS],
+        "open_concerns_total": len(concerns),
+        "completed_milestones": milestones[:DIGEST_ITEMS],
+        "completed_milestones_total": len(milestones),
+        "analysis_items": analysis_items,
+        "analysis_error": analysis_error,
+        "sheet_fingerprint": sheet_fingerprint(index, project),
+        "snapshot_version": index.version,
+        "updated_at": time.time(),
+    }
+    return _with_rule_items(
+        digest, _project_violations(sheet_violations, project), _log_violations(email_logs, as_of), as_of
+    )
+
+
+def _stored_fingerprints():
+    """{project: (fingerprint, consecutive analysis failures, retry_at)}"""
+    return {
+        project: (fingerprint, failures, retry_at)
+        for project, fingerprint, failures, retry_at in _store().execute(
+            "SELECT project, fingerprint, failures, retry_at FROM project_digests"
+        )
+    }
+
+
+def _save_digest(project, fingerprint, digest, failures=0, retry_at=None):
+    conn = _store()
+    conn.execute(
+        "INSERT OR REPLACE INTO project_digests (project, fingerprint, digest, updated_at, failures, retry_at)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        (normalize_project(project), fingerprint, json.dumps(digest), digest["updated_at"], failures, retry_at)
+    )
+    conn.commit()
+
+
+def _finish_scan(projects, stats):
+    conn = _store()
+    known = [normalize_project(p) for p in projects]
+    conn.execute(
+        f"DELETE FROM project_digests WHERE project NOT IN ({','.join('?' * len(known))})", known
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO scan_state (name, value) VALUES ('last_scan', ?)",
+        (json.dumps({**stats, "finished_at": time.time()}),)
+    )
+    conn.commit()
+
+
+def _prepare_scan():
+    snapshot = get_snapshot()
+    index = get_index(snapshot)
+    report = get_report(index)
+    as_of = rule_clock()
+    sheet_violations = evaluate_snapshot(snapshot, load_governance_thresholds(), SHEET_NAMES, as_of)
+    projects = list(dict.fromkeys(
+        str(row.get("Project Name", "")).strip()
+        for row in index.rows["index"] if str(row.get("Project Name", "")).strip()
+    ))
+    return index, report, sheet_violations, as_of, projects
+
+
+def _scan_project(index, report, sheet_violations, as_of, project, stored):
+    email_logs = query_email_logs(project)
+    fingerprint = f"{sheet_fingerprint(index, project)}:{logs_fingerprint(email_logs)}"
+    previous_fingerprint, failures, retry_at = stored.get(normalize_project(project), (None, 0, None))
+    if previous_fingerprint == fingerprint and (not failures or time.time() < (retry_at or 0)):
+        previous = get_digests([project])
+        if previous and "analysis_items" in previous[0]:
+            # Data unchanged: only the time-dependent rule results can differ
+            sheet_items = _project_violations(sheet_violations, project)
+            log_items = _log_violations(email_logs, as_of)
+            if (previous[0]["sheet_rule_items"], previous[0]["log_rule_items"]) != (sheet_items, log_items):
+                digest = _with_rule_items(previous[0], sheet_items, log_items, as_of)
+                _save_digest(project, fingerprint, digest, failures, retry_at)
+            return False
+
+    with span("digest_build"):
+        digest = build_digest(index, report, project, email_logs, sheet_violations, as_of)
+    # A failed analysis is retried once its data changes or its backoff ends
+    retry_at = None
+    if digest["analysis_error"]:
+        failures += 1
+        retry_at = time.time() + min(DIGEST_RETRY_BACKOFF * 2 ** (failures - 1), DIGEST_RETRY_MAX)
+        logger.warning("risk analysis of %s failed (%d in a row): %s", project, failures, digest["analysis_error"])
+    else:
+        failures = 0
+    _save_digest(project, fingerprint, digest, failures, retry_at)
+    return True
+
+
+async def scan_portfolio():
+    """Rebuild digests of changed projects; returns how many were rebuilt, or
+    None when another worker process is already scanning"""
+    with file_lock(DIGEST_STORE + ".lock", blocking=False) as elected:
+        if not elected:
+            return None
+
+        started = time.time()
+        try:
+            await run_blocking(sync_email_logs)
+        except Exception as e:
+            # Digests are still built from the logs stored so far
+            logger.warning("email log sync failed: %s", e)
+
+        index, report, sheet_violations, as_of, projects = await run_blocking(_prepare_scan)
+        stored = await run_blocking(_stored_fingerprints)
+        gate = asyncio.Semaphore(DIGEST_CONCURRENCY)
+
+        async def scan(project):
+            async with gate:
+                return await run_blocking(_scan_project, index, report, sheet_violations, as_of, project, stored)
+
+        results = await asyncio.gather(*[scan(p) for p in projects], return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        for error in failed[:3]:
+            logger.warning("digest failed: %s", error)
+        rebuilt = sum(1 for r in results if r is True)
+        inc("rows_scanned_total", len(projects), stage="digest_scan")
+
+        await run_blocking(_finish_scan, projects, {
+            "snapshot_version": index.version,
+            "projects": len(projects),
+            "rebuilt": rebuilt,
+            "failed": len(failed),
+            "duration_s": round(time.time() - started, 3),
+        })
+        return rebuilt
+
+
+async def run_scheduler():
+    """Scan the portfolio every DIGEST_INTERVAL seconds until cancelled"""
+    while True:
+        try:
+            await scan_portfolio()
+        except Exception as e:
+            logger.warning("portfolio scan failed: %s", e)
+        await asyncio.sleep(DIGEST_INTERVAL)
+
+
+def get_digests(projects=None):
+    """Stored digests, optionally only for the given project names"""
+    sql = "SELECT digest FROM project_digests"
+    args = []
+    if projects is not None:
+        names = [normalize_project(p) for p in projects]
+        sql += f" WHERE project IN ({','.join('?' * len(names))})"
+        args = names
+    return [json.loads(digest) for (digest,) in _store().execute(sql + " ORDER BY project", args)]
+
+
+def last_scan():
+    row = _store().execute("SELECT value FROM scan_state WHERE name = 'last_scan'").fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def current_digests(index, projects):
+    """Digests of the given projects whose sheet rows are unchanged, or None
+    unless every project has one. Sheet rule checks are re-evaluated at the
+    current rule clock; email-log checks are as of the last scan."""
+    digests = get_digests(projects) if projects else []
+    by_name = {normalize_project(d["project"]): d for d in digests}
+    as_of = rule_clock()
+    # Cached per snapshot version and rule clock step (see evaluate_snapshot)
+    sheet_violations = evaluate_snapshot(
+        {"version": index.version, "sheets": index.rows}, load_governance_thresholds(), SHEET_NAMES, as_of
+    )
+    current = []
+    for project in projects:
+        digest = by_name.get(normalize_project(project))
+        if digest is None or digest["sheet_fingerprint"] != sheet_fingerprint(index, project) \
+                or "analysis_items" not in digest:
+            cache_result("digest", False)
+            return None
+        current.append(_with_rule_items(
+            digest, _project_violations(sheet_violations, project), digest["log_rule_items"], as_of
+        ))
+    cache_result("digest", bool(current))
+    return current or None
+
+
+def digest_section(digest):
+    """(project, summary line, risk item lines) of a digest for the /chat
+    context; concerns and milestones come from the ranked sheet rows instead"""
+    summary = f"Scope creep: {digest['scope_creep_status']}"
+    if digest["bu"]:
+        summary += f" | BU: {digest['bu']}"
+    summary += (
+        f" | Open concerns: {digest['open_concerns_total']}"
+        f" | Completed milestones: {digest['completed_milestones_total']}"
+    )
+    items = [
+        f"- {item.get('type', '')}: {item.get('reason', '')} ({item.get('reference', '')})"
+        for item in digest["risk_items"]
+    ]
+    return digest["project"], summary, items
@@ -1,11 +1,216 @@
+import os
+import json
+import codecs
+import sqlite3
+import threading
 import requests
+from metrics import inc, span
+from file_lock import file_lock
+
+# emailLogs is mirrored into a local append-only SQLite store. Each sync pulls
+# only entries after the persisted cursor, one page at a time, and parses
+# every page incrementally so no page is ever held in memory as a whole.
+FIREBASE_DB_URL = os.getenv(
+    "FIREBASE_DB_URL",
+    "https://db-meshboard-database-default-rtdb.asia-southeast1.firebasedatabase.app"
+)
+EMAIL_LOGS_PATH = "emailLogs"
+PAGE_SIZE = int(os.getenv("FIREBASE_PAGE_SIZE", "500"))
+EMAIL_LOG_STORE = os.getenv("EMAIL_LOG_STORE", os.path.join(".cache", "email_logs.sqlite"))
+REQUEST_TIMEOUT = float(os.getenv("FIREBASE_TIMEOUT", "30"))
+
+_session = requests.Session()
+_local = threading.local()
+_sync_lock = threading.Lock()
+
+
+def _store():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(EMAIL_LOG_STORE) or ".", exist_ok=True)
+        conn = sqlite3.connect(EMAIL_LOG_STORE, timeout=30)
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS email_logs ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE NOT NULL,"
+            " project TEXT, data TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS email_logs_project ON email_logs (project);"
+            "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT);"
+        )
+        _local.conn = conn
+    return conn
+
+
+def _project_of(entry):
+    if not isinstance(entry, dict):
+        return None
+    for field in ("Project Name", "projectName", "project", "Project"):
+        if entry.get(field):
+            return str(entry[field]).strip().lower()
+    return None
+
+
+def iter_object_items(chunks):
+    """Incrementally parse a top-level JSON object from byte chunks.
+
+    Yields (key, value) pairs as soon as each member is complete, so memory
+    is bounded by the largest single member rather than the whole document.
+    A top-level `null` (Firebase's reply for an empty range) yields nothing.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+
+    def peek():
+        # Next non-whitespace character, reading more input as needed
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                raise ValueError("Unexpected end of JSON input")
+            fill()
+
+    def decode():
+        # A value is only accepted once a delimiter follows it, so a number
+        # split across chunks (e.g. "12" + "3.5") is never read short
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                if eof or (end < len(buf) and buf[end] in " \t\r\n,:}]"):
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    first = peek()
+    if first != "{":
+        if decode() is None:
+            return
+        raise ValueError("Expected a JSON object")
+    pos += 1
+
+    if peek() == "}":
+        return
+    while True:
+        peek()
+        key = decode()
+        if peek() != ":":
+            raise ValueError("Expected ':' in JSON object")
+        pos += 1
+        peek()
+        yield key, decode()
+
+        sep = peek()
+        pos += 1
+        if sep == "}":
+            return
+        if sep != ",":
+            raise ValueError("Expected ',' or '}' in JSON object")
+
+
+def _fetch_page(cursor):
+    """Stream one page of emailLogs ordered by key, starting at the cursor (inclusive)"""
+    params = {"orderBy": '"$key"', "limitToFirst": PAGE_SIZE}
+    if cursor is not None:
+        params["startAt"] = json.dumps(cursor)
+        params["limitToFirst"] = PAGE_SIZE + 1  # startAt includes the cursor entry itself
+
+    url = f"{FIREBASE_DB_URL}/{EMAIL_LOGS_PATH}.json"
+    inc("upstream_requests_total", upstream="firebase")
+    with span("firebase_page"):
+        with _session.get(url, params=params, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            yield from iter_object_items(response.iter_content(chunk_size=64 * 1024))
+
+
+def sync_email_logs() -> int:
+    """Append every entry newer than the stored cursor; returns how many were added"""
+    with _sync_lock, file_lock(EMAIL_LOG_STORE + ".lock", blocking=False) as elected:
+        if not elected:
+            # Another worker process is syncing into the same store: wait for
+            # it to finish and serve what it stored instead of refetching
+            with file_lock(EMAIL_LOG_STORE + ".lock"):
+                return 0
+
+        conn = _store()
+        row = conn.execute("SELECT value FROM sync_state WHERE name = 'emailLogs.cursor'").fetchone()
+        cursor = row[0] if row else None
+        added = 0
+
+        while True:
+            page_count, last_key = 0, cursor
+            try:
+                for key, entry in _fetch_page(cursor):
+                    if key == cursor:
+                        continue
+                    page_count += 1
+                    # Push ids sort lexicographically in creation order; pages
+                    # may arrive unordered, so track the largest key seen
+                    if last_key is None or key > last_key:
+                        last_key = key
+                    conn.execute(
+                        "INSERT OR IGNORE INTO email_logs (key, project, data) VALUES (?, ?, ?)",
+                        (key, _project_of(entry), json.dumps(entry))
+                    )
+
+                if page_count:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sync_state (name, value) VALUES ('emailLogs.cursor', ?)",
+                        (last_key,)
+                    )
+                conn.commit()
+            except Exception:
+                # A page is stored together with its cursor or not at all
+                conn.rollback()
+                raise
+            added += page_count
+            inc("rows_scanned_total", page_count, stage="firebase_sync")
+            cursor = last_key
+
+            if page_count < PAGE_SIZE:
+                return added
+
+
+def query_email_logs(project: str = None, limit: int = None) -> list:
+    """Entries from the local store in arrival order, optionally for one project"""
+    sql = "SELECT key, data FROM email_logs"
+    args = []
+    if project:
+        sql += " WHERE project = ?"
+        args.append(project.strip().lower())
+    sql += " ORDER BY seq"
+    if limit:
+        sql += " LIMIT ?"
+        args.append(limit)
+    return [_with_key(key, json.loads(data)) for key, data in _store().execute(sql, args)]
+
+
+def _with_key(key, entry):
+    return {"key": key, **entry} if isinstance(entry, dict) else {"key": key, "value": entry}
+
 
 def get_email_logs():
-    url = "https://db-meshboard-database-default-rtdb.asia-southeast1.firebasedatabase.app/emailLogs.json"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
+        sync_email_logs()
+        return {
+            key: json.loads(data)
+            for key, data in _store().execute("SELECT key, data FROM email_logs ORDER BY seq")
+        }
     except Exception as e:
         return {"error": str(e)}
-
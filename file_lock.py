@@ -0,0 +1,27 @@
+import os
+import fcntl
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """Exclusive advisory lock shared by every worker process on this host.
+
+    Yields True once the lock is held. With blocking=False it yields False
+    straight away when another process holds it, so callers can elect a
+    single worker to refresh shared data while the others keep serving.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -1,7 +1,15 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 import os
-import requests
+import json
+import logging
+import time
+import sqlite3
+import threading
+from upstream import BACKGROUND, GROQ_MODEL, google_call, post_chat_completion, run_blocking
+from llm_cache import cache_key, response_cache
+from metrics import cache_result, inc, span
+from file_lock import file_lock
 
 # ✅ Define scopes
 SCOPES = [
@@ -10,68 +18,222 @@ SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets.readonly"
 ]
 
-# ✅ Load credentials
-credentials = service_account.Credentials.from_service_account_file(
-    "google-sheets-access.json", scopes=SCOPES
-)
+# ✅ Load credentials (on first use, so the module imports without the file)
+_credentials = None
+
+def _load_credentials():
+    global _credentials
+    if _credentials is None:
+        _credentials = service_account.Credentials.from_service_account_file(
+            "google-sheets-access.json", scopes=SCOPES
+        )
+    return _credentials
 
 # ✅ Build clients
-drive_service = build("drive", "v3", credentials=credentials)
-docs_service = build("docs", "v1", credentials=credentials)
+# googleapiclient's HTTP transport is not thread-safe, and Drive/Docs calls now
+# run in worker threads, so each thread gets its own pair of clients. Stubs
+# assigned to drive_service / docs_service (benchmarks) are used instead.
+drive_service = None
+docs_service = None
+_clients = threading.local()
 
-def summarize_with_llm(raw_text: str) -> str:
-    """Send raw doc content to Groq for summary"""
+def _drive_service():
+    if drive_service is not None:
+        return drive_service
+    if not hasattr(_clients, "drive"):
+        _clients.drive = build("drive", "v3", credentials=_load_credentials())
+    return _clients.drive
+
+def _docs_service():
+    if docs_service is not None:
+        return docs_service
+    if not hasattr(_clients, "docs"):
+        _clients.docs = build("docs", "v1", credentials=_load_credentials())
+    return _clients.docs
+
+# ✅ Scope doc cache
+# The folder listing is kept for DRIVE_LISTING_TTL seconds. Extracted text and
+# LLM summaries persist on disk keyed by Drive file id + modifiedTime, so a doc
+# is only downloaded and re-summarized after it actually changes. The listing
+# is stored in the same database, so worker processes share one Drive call.
+DRIVE_LISTING_TTL = float(os.getenv("DRIVE_LISTING_TTL", "300"))
+SCOPE_CACHE_PATH = os.getenv("SCOPE_CACHE_PATH", os.path.join(".cache", "scope_docs.sqlite"))
+
+logger = logging.getLogger("risk_report.scope_docs")
+
+_listing = {"files": None, "fetched_at": 0.0, "by_project": {}}
+_listing_lock = threading.Lock()
+
+def _cache_db():
+    conn = getattr(_clients, "cache_db", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(SCOPE_CACHE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(SCOPE_CACHE_PATH, timeout=30)
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS scope_docs ("
+            " file_id TEXT PRIMARY KEY, modified_time TEXT, raw_text TEXT,"
+            " summary TEXT, updated_at REAL);"
+            "CREATE TABLE IF NOT EXISTS drive_listing ("
+            " folder_id TEXT PRIMARY KEY, files TEXT NOT NULL, fetched_at REAL);"
+        )
+        _clients.cache_db = conn
+    return conn
+
+def _read_cached_doc(file: dict):
+    """(raw_text, summary) cached for this revision of the doc, or None"""
+    row = _cache_db().execute(
+        "SELECT raw_text, summary FROM scope_docs WHERE file_id = ? AND modified_time = ?",
+        (file["id"], file.get("modifiedTime", ""))
+    ).fetchone()
+    return row
+
+def _write_cached_doc(file: dict, raw_text: str, summary):
+    conn = _cache_db()
+    conn.execute(
+        "INSERT OR REPLACE INTO scope_docs (file_id, modified_time, raw_text, summary, updated_at)"
+        " VALUES (?, ?, ?, ?, ?)",
+        (file["id"], file.get("modifiedTime", ""), raw_text, summary, time.time())
+    )
+    conn.commit()
+
+def _read_shared_listing(folder_id: str):
+    """Drive listing stored by any worker if it is still within the TTL, else None"""
+    row = _cache_db().execute(
+        "SELECT files, fetched_at FROM drive_listing WHERE folder_id = ?", (folder_id,)
+    ).fetchone()
+    if row is None or time.time() - row[1] >= DRIVE_LISTING_TTL:
+        return None
+    return json.loads(row[0]), row[1]
+
+def _write_shared_listing(folder_id: str, files: list, fetched_at: float):
+    conn = _cache_db()
+    conn.execute(
+        "INSERT OR REPLACE INTO drive_listing (folder_id, files, fetched_at) VALUES (?, ?, ?)",
+        (folder_id, json.dumps(files), fetched_at)
+    )
+    conn.commit()
+
+async def _request_summary(raw_text: str):
+    """Groq summary of a scope doc, or None when no summary could be produced"""
     api_key = os.getenv("GROQ_API_KEY")
     if not api_key:
-        return raw_text[:1500]
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+        return None
 
     summarizer_prompt = (
         "You are a project scope summarizer. Summarize the following scope document clearly, preserving module names, flows, business goals, timelines, and deliverables.\n"
         + raw_text[:6000]
     )
 
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers=headers,
-        json={
-            "model": "llama3-8b-8192",
-            "messages": [
-                {"role": "system", "content": "You are a scope summarizer for project governance."},
-                {"role": "user", "content": summarizer_prompt}
-            ],
-            "temperature": 0.3
-        }
-    )
+    async def complete():
+        # Summaries queue behind interactive chats for Groq capacity
+        try:
+            with span("doc_summarize"):
+                response = await post_chat_completion({
+                    "model": GROQ_MODEL,
+                    "messages": [
+                        {"role": "system", "content": "You are a scope summarizer for project governance."},
+                        {"role": "user", "content": summarizer_prompt}
+                    ],
+                    "temperature": 0.3
+                }, api_key, priority=BACKGROUND)
+        except Exception as e:
+            logger.warning("scope summary failed, using raw text: %s", e)
+            return None
+
+        if response.status_code == 200:
+            return response.json()["choices"][0]["message"]["content"].strip()
+        logger.warning("scope summary failed with HTTP %s, using raw text", response.status_code)
+        return None
 
-    if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"].strip()
-    else:
+    # Concurrent chats about the same project share one summarization call
+    return await response_cache.get_or_compute(cache_key(GROQ_MODEL, "scope-summary", summarizer_prompt), complete)
+
+async def summarize_with_llm(raw_text: str) -> str:
+    """Send raw doc content to Groq for summary"""
+    summary = await _request_summary(raw_text)
+    if summary is None:
         return raw_text[:1500]  # fallback
+    return summary
 
-def get_scope_summary(project_name: str) -> str:
-    """Finds the doc by project name and returns summarized content"""
+def list_scope_docs() -> list:
+    """Lists the scope docs in the configured Drive folder (blocking, cached)"""
     folder_id = os.getenv("GOOGLE_DOCS_FOLDER_ID")
     if not folder_id:
+        return []
+
+    with _listing_lock:
+        if _listing["files"] is not None and time.time() - _listing["fetched_at"] < DRIVE_LISTING_TTL:
+            cache_result("drive_listing", True)
+            return _listing["files"]
+
+        # Only one worker lists the folder; the rest pick up what it stored
+        with file_lock(SCOPE_CACHE_PATH + ".listing.lock"):
+            shared = _read_shared_listing(folder_id)
+            cache_result("drive_listing", shared is not None)
+            if shared is not None:
+                files, fetched_at = shared
+            else:
+                query = f"mimeType='application/vnd.google-apps.document' and '{folder_id}' in parents"
+                files, page_token = [], None
+                with span("drive_list"):
+                    while True:
+                        inc("upstream_requests_total", upstream="drive")
+                        results = google_call("drive", _drive_service().files().list(
+                            q=query,
+                            fields="nextPageToken, files(id, name, modifiedTime)",
+                            pageSize=1000,
+                            pageToken=page_token
+                        ))
+                        files.extend(results.get("files", []))
+                        page_token = results.get("nextPageToken")
+                        if not page_token:
+                            break
+                fetched_at = time.time()
+                _write_shared_listing(folder_id, files, fetched_at)
+
+        _listing.update(files=files, fetched_at=fetched_at, by_project={})
+        return files
+
+def find_scope_doc(project_name: str, files: list):
+    """First doc whose name contains the project name, memoized per listing"""
+    key = project_name.lower()
+    by_project = _listing["by_project"] if files is _listing["files"] else {}
+    if key not in by_project:
+        by_project[key] = next((f for f in files if key in f["name"].lower()), None)
+    return by_project[key]
+
+def fetch_doc_text(doc_id: str) -> str:
+    """Downloads a Google Doc and returns its plain text (blocking)"""
+    inc("upstream_requests_total", upstream="docs")
+    with span("doc_fetch"):
+        doc = google_call("docs", _docs_service().documents().get(documentId=doc_id))
+    content = doc.get("body", {}).get("content", [])
+    raw_text = "\n".join(
+        elem.get("paragraph", {}).get("elements", [{}])[0].get("textRun", {}).get("content", "")
+        for elem in content if "paragraph" in elem
+    )
+    return raw_text.strip()
+
+async def get_scope_summary(project_name: str, files: list = None) -> str:
+    """Finds the doc by project name and returns summarized content.
+
+    Pass `files` from list_scope_docs() when the listing was already fetched
+    concurrently with other upstream calls.
+    """
+    if files is None:
+        files = await run_blocking(list_scope_docs)
+
+    file = find_scope_doc(project_name, files)
+    if file is None:
         return ""
 
-    query = f"mimeType='application/vnd.google-apps.document' and '{folder_id}' in parents"
-    results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-    files = results.get("files", [])
-
-    for file in files:
-        if project_name.lower() in file["name"].lower():
-            doc_id = file["id"]
-            doc = docs_service.documents().get(documentId=doc_id).execute()
-            content = doc.get("body", {}).get("content", [])
-            raw_text = "\n".join(
-                elem.get("paragraph", {}).get("elements", [{}])[0].get("textRun", {}).get("content", "")
-                for elem in content if "paragraph" in elem
-            )
-            return summarize_with_llm(raw_text.strip())
-
-    return ""
+    cached = await run_blocking(_read_cached_doc, file)
+    cache_result("scope_doc", cached is not None and cached[1] is not None)
+    if cached is not None and cached[1] is not None:
+        return cached[1]
+
+    raw_text = cached[0] if cached is not None else await run_blocking(fetch_doc_text, file["id"])
+    summary = await _request_summary(raw_text)
+    # The text is kept even if summarizing failed, so a retry skips the download
+    await run_blocking(_write_cached_doc, file, raw_text, summary)
+    return summary if summary is not None else raw_text[:1500]
@@ -0,0 +1,134 @@
+import os
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from metrics import cache_result
+
+# Completions are cached by (model, normalized question, hash of the context
+# sent with it). Identical requests that arrive while the first is still
+# running wait for that call instead of starting their own (single flight),
+# whether the first one is a plain completion or a stream.
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "600"))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def cache_key(model: str, query: str, context: str = "") -> str:
+    context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\0{normalize_query(query)}\0{context_hash}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of LLM responses with in-flight request coalescing.
+
+    Only used from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() > expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _count(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        cache_result("llm_response", hit)
+
+    async def _join(self, key):
+        """(True, value) from the cache or an identical in-flight call, else (False, None)"""
+        while True:
+            value = self.get(key)
+            if value is None:
+                future = self._inflight.get(key)
+                if future is None:
+                    return False, None
+                try:
+                    value = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # The leader was cancelled (e.g. its client left); take over
+                    if future.cancelled():
+                        continue
+                    raise
+            self._count(True)
+            return True, value
+
+    async def lookup(self, key):
+        """Cached value, else the result of an identical in-flight call, else
+        None: the caller should then compute it under `lead`. The leader's
+        exception reaches every waiter.
+        """
+        return (await self._join(key))[1]
+
+    @contextmanager
+    def lead(self, key):
+        """Register the caller as the one computing `key`, so identical
+        lookups wait for it instead of calling the LLM again.
+
+        Yields `publish(value)`, which hands the result to the waiters and
+        caches it (None results, e.g. a fallback after an upstream failure,
+        are not cached). An exception leaving the block reaches the waiters;
+        leaving without publishing lets one of them take over.
+        """
+        self._count(False)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        def publish(value):
+            future.set_result(value)
+            if value is not None:
+                self.put(key, value)
+
+        try:
+            yield publish
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # Mark the exception retrieved when nobody else was waiting
+                future.exception()
+            raise
+        finally:
+            # Cancelled, closed mid-stream or left without a result
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
+
+    async def get_or_compute(self, key, compute):
+        """Cached value, else the result of an identical in-flight call (even
+        a None fallback), else `await compute()`"""
+        found, value = await self._join(key)
+        if found:
+            return value
+        with self.lead(key) as publish:
+            value = await compute()
+            publish(value)
+        return value
+
+
+response_cache = ResponseCache()
@@ -1,17 +1,45 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import base64
+import json
+import multiprocessing
 import os
-import requests
-import tempfile
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from sheets_utils import fetch_sheet_data
-from google_docs_utils import get_scope_summary
-
-app = FastAPI()
+import threading
+import httpx
+from sheets_utils import SHEET_NAMES, get_snapshot
+from google_docs_utils import get_scope_summary, list_scope_docs
+from sheet_index import get_index, normalize_project
+from scope_classifier import LOG_COLUMNS, get_report
+from context_builder import build_context
+from llm_cache import cache_key, response_cache
+from report_pdf import render_batch_item, render_scope_creep_pdf, zip_pdfs
+from analyzers.governance_rules import BUSINESS_TIMEZONE, evaluate_snapshot, parse_time, rule_clock
+from analyzers.risk_llm import load_governance_thresholds
+from digests import DIGEST_INTERVAL, current_digests, digest_section, get_digests, last_scan, run_scheduler, scan_portfolio
+from metrics import TimingMiddleware, cache_result, render_prometheus, span
+import upstream
+from rate_limit import CircuitOpenError
+
+@asynccontextmanager
+async def lifespan(app):
+    # Per-project risk digests are refreshed in the background (see digests.py)
+    scheduler = asyncio.create_task(run_scheduler()) if DIGEST_INTERVAL > 0 else None
+    yield
+    if scheduler is not None:
+        scheduler.cancel()
+    await upstream.aclose()
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,8 +47,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Server-Timing"],
 )
 
+class DataGZipMiddleware(GZipMiddleware):
+    """gzip only the sheet data endpoints; PDFs and zips are already compressed"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/data/"):
+            return await super().__call__(scope, receive, send)
+        return await self.app(scope, receive, send)
+
+app.add_middleware(DataGZipMiddleware, minimum_size=1024, compresslevel=6)
+
+# Per-stage timings go to /metrics and, for each response, a Server-Timing header
+app.add_middleware(TimingMiddleware)
+
 class ChatPrompt(BaseModel):
     message: str
 
@@ -28,85 +70,45 @@ def row_matches_query(row, keywords):
     text = " ".join([str(cell).lower() for cell in row.values()])
     return any(keyword.lower() in text for keyword in keywords)
 
-def format_row(row):
-    keys = ["Email Record ID", "Date", "From", "Subject", "Body", "Project Name", "Insights"]
-    return {k: row.get(k, "") for k in keys if k in row}
-
-def truncate_text(text, max_chars=15000):
-    return text[:max_chars]
-
-@app.post("/chat")
-async def chat_with_context(prompt: ChatPrompt):
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        return {"error": "⚠️ GROQ_API_KEY not set in environment"}
+# /chat is split into stages so the streaming variant can report progress
+# between them; both variants build exactly the same payload.
 
-    index_data = fetch_sheet_data("index")["data"]
-    extractor_data = fetch_sheet_data("extractor")["data"]
-    manager_data = fetch_sheet_data("manager")["data"]
-
-    project_keywords = list({
-        str(row.get("Project Name", "")).strip()
-        for row in index_data + manager_data
-        if row.get("Project Name")
-    })
-
-    user_query = prompt.message.strip().lower()
-    matched_keywords = [kw for kw in project_keywords if kw.lower() in user_query]
-    keywords_to_check = matched_keywords if matched_keywords else user_query.split()
-
-    expanded_query = prompt.message
+async def load_chat_sources(message):
+    """Sheet index, projects mentioned in the message and the scope doc listing"""
+    # Sheets snapshot and the Drive folder listing don't depend on each other
+    with span("chat_sources"):
+        snapshot, scope_docs = await asyncio.gather(
+            upstream.run_blocking(get_snapshot),
+            upstream.run_blocking(list_scope_docs),
+        )
+    # Index and report builds are CPU-bound and take locks; keep them off the loop
+    index = await upstream.run_blocking(get_index, snapshot)
+    with span("match_projects"):
+        matched_keywords = index.match_projects(message.strip().lower())
+    return index, matched_keywords, scope_docs
+
+async def load_digests(index, matched_keywords):
+    """Precomputed digests of the matched projects, or None if any is missing or outdated"""
+    if not matched_keywords:
+        return None
+    return await upstream.run_blocking(current_digests, index, matched_keywords)
+
+async def load_scope_context(matched_keywords, scope_docs):
+    if not matched_keywords:
+        return ""
+    with span("scope_doc"):
+        return await get_scope_summary(matched_keywords[0], scope_docs)
+
+def build_chat_payload(message, index, matched_keywords, doc_context, digests=None):
+    user_query = message.strip().lower()
+
+    expanded_query = message
     if "scope creep" in user_query:
         expanded_query += (
             "\n\nPlease check if the project has introduced features, flows, or changes "
             "that were not listed in the original scope document, or if any approvals are missing."
         )
 
-    def filter_and_limit(data, project_names):
-        filtered = [row for row in data if str(row.get("Project Name", "")).lower() in [p.lower() for p in project_names]]
-        return sorted(filtered, key=lambda x: x.get("Date", ""), reverse=True)[:10]
-
-    relevant_index = filter_and_limit(index_data, matched_keywords)
-    relevant_extractor = filter_and_limit(extractor_data, matched_keywords)
-    relevant_manager = filter_and_limit(manager_data, matched_keywords)
-
-    doc_context = get_scope_summary(matched_keywords[0]) if matched_keywords else ""
-    doc_summary = f"--- 📄 Scope Document: {matched_keywords[0]} ---\n{doc_context.strip()}\n\n" if doc_context else ""
-
-    def summarize(data, label):
-        if not data:
-            return f"No data available in {label}.\n"
-
-        try:
-            data_sorted = sorted(data, key=lambda x: x.get("Date", ""), reverse=True)
-        except Exception:
-            data_sorted = data
-
-        latest = [format_row(row) for row in data_sorted[:5]]
-        open_concerns = [format_row(row) for row in data_sorted if any(k in str(row).lower() for k in ["issue", "delay", "blocked", "escalated"])]
-        completed = [format_row(row) for row in data_sorted if any(k in str(row).lower() for k in ["100%", "completed", "finalized", "signed off"])]
-
-        output = f"--- 📬 {label} ---\n\n📊 Latest Entries:\n" + "\n".join([str(r) for r in latest]) + "\n"
-        if open_concerns:
-            output += "\n⚠️ Open Concerns:\n" + "\n".join([str(r) for r in open_concerns[:3]]) + "\n"
-        if completed:
-            output += "\n✅ Completed Milestones:\n" + "\n".join([str(r) for r in completed[:3]]) + "\n"
-        return output + "\n"
-
-    if not relevant_index and not relevant_extractor and not relevant_manager and not doc_context:
-        context = (
-            "You are a project governance and client success assistant.\n\n"
-            "The user asked a question, but no relevant scope or email records were found.\n"
-            "Kindly advise them to follow up with the project team for more information."
-        )
-    else:
-        context = (
-            f"{doc_summary}"
-            f"{summarize(relevant_index, 'Index')}"
-            f"{summarize(relevant_extractor, 'Email Extractor')}"
-            f"{summarize(relevant_manager, 'Email Manager')}"
-        )
-
     instruction_header = (
         "You are an intelligent project governance and client success assistant AI.\n"
         "Your goals:\n"
@@ -118,16 +120,23 @@ async def chat_with_context(prompt: ChatPrompt):
         "Always back up your reasoning with facts from the content.\n\n"
     )
 
-    final_context = truncate_text(instruction_header + context)
-
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    has_rows = any(index.project_row_ids(key, matched_keywords, limit=1) for key in index.rows)
+    if not digests and not has_rows and not doc_context:
+        final_context = instruction_header + (
+            "You are a project governance and client success assistant.\n\n"
+            "The user asked a question, but no relevant scope or email records were found.\n"
+            "Kindly advise them to follow up with the project team for more information."
+        )
+    else:
+        # Digest summaries and risk items from the background scan are ranked
+        # together with the rows and scope doc under one token budget
+        final_context = build_context(
+            index, get_report(index), matched_keywords, doc_context, message, header=instruction_header,
+            digests=[digest_section(d) for d in digests or []],
+        )
 
     payload = {
-        "model": "llama3-8b-8192",
+        "model": upstream.GROQ_MODEL,
         "messages": [
             {"role": "system", "content": final_context},
             {"role": "user", "content": expanded_query}
@@ -135,174 +144,425 @@ async def chat_with_context(prompt: ChatPrompt):
         "temperature": 0.3
     }
 
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
+    return payload
+
+def chat_cache_key(message, payload):
+    return cache_key(payload["model"], message, payload["messages"][0]["content"])
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def upstream_error(e):
+    response = getattr(e, "response", None)
+    error = {
+        "error": str(e),
+        "response_text": getattr(response, "text", ""),
+        "status_code": getattr(response, "status_code", "")
+    }
+    if isinstance(e, CircuitOpenError):
+        error.update(status_code=503, retry_after=round(e.retry_after))
+    elif response is not None and response.headers.get("retry-after"):
+        error["retry_after"] = response.headers["retry-after"]
+    return error
+
+@app.post("/chat")
+async def chat_with_context(prompt: ChatPrompt, request: Request):
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return await chat_stream(prompt, request)
+
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        return {"error": "⚠️ GROQ_API_KEY not set in environment"}
+
+    index, matched_keywords, scope_docs = await load_chat_sources(prompt.message)
+    doc_context = await load_scope_context(matched_keywords, scope_docs)
+    digests = await load_digests(index, matched_keywords)
+    payload = await upstream.run_blocking(
+        build_chat_payload, prompt.message, index, matched_keywords, doc_context, digests
+    )
+
+    async def complete():
+        with span("llm"):
+            response = await upstream.post_chat_completion(payload, api_key)
+            response.raise_for_status()
         result = response.json()
-        return {"response": result["choices"][0]["message"]["content"]}
-    except requests.exceptions.RequestException as e:
-        return {
-            "error": str(e),
-            "payload": payload,
-            "response_text": getattr(e.response, "text", ""),
-            "status_code": getattr(e.response, "status_code", "")
-        }
+        return result["choices"][0]["message"]["content"]
 
-# ➕ Scope Summary, PDF, and Sheet APIs remain unchanged
+    try:
+        content = await response_cache.get_or_compute(chat_cache_key(prompt.message, payload), complete)
+        return {"response": content}
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        return upstream_error(e)
+
+@app.post("/chat/stream")
+async def chat_stream(prompt: ChatPrompt, request: Request):
+    """Server-sent events: `status` updates, then `token` chunks, then `done` (or `error`)"""
+    api_key = os.getenv("GROQ_API_KEY")
 
-@app.get("/data/index-sheet")
-async def get_index_sheet_data():
-    return fetch_sheet_data("index")
+    async def events():
+        if not api_key:
+            yield sse_event("error", {"error": "⚠️ GROQ_API_KEY not set in environment"})
+            return
 
-@app.get("/data/email-extractor")
-async def get_email_extractor_data():
-    return fetch_sheet_data("extractor")
+        # The 200 headers are already sent, so every failure from here on has
+        # to reach the client as an `error` event
+        try:
+            index, matched_keywords, scope_docs = await load_chat_sources(prompt.message)
+            doc_context = await load_scope_context(matched_keywords, scope_docs)
+            if doc_context:
+                yield sse_event("status", {"message": "scope doc loaded"})
+
+            digests = await load_digests(index, matched_keywords)
+            payload = await upstream.run_blocking(
+                build_chat_payload, prompt.message, index, matched_keywords, doc_context, digests
+            )
+            yield sse_event("status", {"message": "context assembled"})
+
+            if await request.is_disconnected():
+                return
+
+            # Replay a cached answer, or the result of an identical request that
+            # is already running (streamed or not); otherwise stream it ourselves
+            # while identical requests wait for this one.
+            key = chat_cache_key(prompt.message, payload)
+            cached = await response_cache.lookup(key)
+            if cached is not None:
+                yield sse_event("token", {"content": cached})
+                yield sse_event("done", {})
+                return
+
+            # If the client goes away mid-stream Starlette cancels this generator,
+            # which closes the upstream response and frees the LLM slot.
+            with response_cache.lead(key) as publish:
+                tokens = []
+                with span("llm"):
+                    async for token in upstream.stream_chat_completion(payload, api_key):
+                        tokens.append(token)
+                        yield sse_event("token", {"content": token})
+                publish("".join(tokens))
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            yield sse_event("error", upstream_error(e))
+            return
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+        yield sse_event("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@app.get("/data/email-manager")
-async def get_email_manager_data():
-    return fetch_sheet_data("manager")
+# ➕ Scope Summary, PDF, and Sheet APIs remain unchanged
 
-@app.get("/risk-report/scope-creep/summary")
-async def get_scope_creep_summary():
-    # (No changes required here. Already works as expected.)
-    index_data = fetch_sheet_data("index")["data"]
-    extractor_data = fetch_sheet_data("extractor")["data"]
-    manager_data = fetch_sheet_data("manager")["data"]
+# Plain `def` endpoints run in FastAPI's threadpool, so a cold sheet fetch or
+# PDF rendering doesn't stall the event loop for in-flight chats.
 
-    keywords = ["scope creep", "not in scope", "added", "new", "expanded"]
-    resolutions = ["approved", "acknowledged", "taken care", "phase 2"]
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates or "*" in candidates
 
-    def eval_status(row):
-        t = " ".join([str(v).lower() for v in row.values()])
-        if any(k in t for k in keywords): return "YES"
-        if any(k in t for k in resolutions): return "NO"
-        return "TBD"
+# /data/* serve one tab of the snapshot. Without query parameters they return
+# the whole tab as before; otherwise rows can be filtered by project and date,
+# projected to a few fields and paged with an opaque cursor, as JSON or NDJSON.
+DATA_MAX_PAGE_SIZE = int(os.getenv("DATA_MAX_PAGE_SIZE", "5000"))
+NDJSON_BATCH_ROWS = 500
 
-    summary = [
-        {
-            "project": row.get("Project Name", ""),
-            "bu": row.get("BU", ""),
-            "solution_center": row.get("Solution Center", ""),
-            "status": eval_status(row)
-        }
-        for row in index_data
-    ]
+def encode_cursor(version, row_id):
+    return base64.urlsafe_b64encode(f"{version}:{row_id}".encode()).decode().rstrip("=")
 
-    signals = [
-        {k: r.get(k, "") for k in ["Project", "Mode", "Date", "Insights"]}
-        for r in extractor_data + manager_data
-        if any(k in str(r.get("Insights", "")).lower() for k in keywords)
-    ]
+def decode_cursor(cursor):
+    """(snapshot version, last row id) of a cursor, or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        version, row_id = raw.rsplit(":", 1)
+        return version, int(row_id)
+    except ValueError:
+        return None
 
-    corrective = [
-        {k: r.get(k, "") for k in ["Project", "Mode", "Date", "Insights"]}
-        for r in extractor_data + manager_data
-        if any(k in str(r.get("Insights", "")).lower() for k in resolutions)
-    ]
+def ndjson_lines(rows):
+    for start in range(0, len(rows), NDJSON_BATCH_ROWS):
+        yield "".join(json.dumps(row) + "\n" for row in rows[start:start + NDJSON_BATCH_ROWS])
 
-    return JSONResponse(content={
-        "summary": summary,
-        "signals": signals,
-        "corrective": corrective
-    })
+def sheet_data(key, request, project, since, until, fields, cursor, limit, format):
+    try:
+        snapshot = get_snapshot()
+    except Exception as e:
+        return {"error": str(e)}
+
+    ndjson = format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", "")
+    # The response is a pure function of the snapshot and the URL
+    etag = f'"{snapshot["version"]}-ndjson"' if ndjson else f'"{snapshot["version"]}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    after = -1
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return JSONResponse(status_code=400, content={"error": "Invalid cursor"})
+        if decoded[0] != snapshot["version"]:
+            return JSONResponse(status_code=409, content={"error": "Sheet data changed; restart from the first page"})
+        after = decoded[1]
+
+    page_size = min(limit, DATA_MAX_PAGE_SIZE) if limit else None
+    index = get_index(snapshot)
+    with span("data_select"):
+        ids = index.select_row_ids(
+            key, project, since, until, after=after, limit=page_size + 1 if page_size else None
+        )
+    next_cursor = None
+    if page_size and len(ids) > page_size:
+        ids = ids[:page_size]
+        next_cursor = encode_cursor(snapshot["version"], ids[-1])
+
+    rows = index.rows[key]
+    columns = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    data = [{c: rows[i].get(c, "") for c in columns} for i in ids] if columns else [rows[i] for i in ids]
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if ndjson:
+        return StreamingResponse(ndjson_lines(data), media_type="application/x-ndjson", headers=headers)
+    with span("serialize"):
+        body = json.dumps({"data": data, "next_cursor": next_cursor})
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def sheet_data_endpoint(key):
+    def endpoint(
+        request: Request,
+        project: list[str] = Query(None, description="Project name; repeat for several"),
+        since: str = Query(None, description="Earliest Date, inclusive (e.g. 2024-03-01)"),
+        until: str = Query(None, description="Latest Date, inclusive"),
+        fields: str = Query(None, description="Comma-separated columns to return"),
+        cursor: str = Query(None, description="next_cursor of the previous page"),
+        limit: int = Query(None, ge=1, description=f"Page size, at most {DATA_MAX_PAGE_SIZE}"),
+        format: str = Query("json", pattern="^(json|ndjson)$"),
+    ):
+        return sheet_data(key, request, project, since, until, fields, cursor, limit, format)
+    endpoint.__name__ = f"get_{key}_sheet_data"
+    return endpoint
+
+app.get("/data/index-sheet")(sheet_data_endpoint("index"))
+app.get("/data/email-extractor")(sheet_data_endpoint("extractor"))
+app.get("/data/email-manager")(sheet_data_endpoint("manager"))
 
-@app.get("/risk-report/scope-creep/pdf")
-async def generate_scope_creep_pdf():
-    # (Also unchanged — generates A1, A2, A3 sectioned report as PDF)
-    index_data = fetch_sheet_data("index")["data"]
-    extractor_data = fetch_sheet_data("extractor")["data"]
-    manager_data = fetch_sheet_data("manager")["data"]
+@app.get("/risk-report/scope-creep/summary")
+def get_scope_creep_summary(request: Request):
+    # The report is a pure function of the snapshot, so its version is the ETag
+    # and unchanged polls are answered before touching the report at all.
+    snapshot = get_snapshot()
+    etag = f'"{snapshot["version"]}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    report = get_report(get_index(snapshot))
+    with span("serialize"):
+        body = report.summary_json()
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
 
-    keywords = ["scope creep", "not in scope", "added", "new", "expanded"]
-    resolutions = ["approved", "acknowledged", "taken care", "phase 2"]
+@app.get("/risk-report/governance")
+def get_governance_violations(request: Request, project: str = None, as_of: str = None):
+    """Numeric governance rule violations across every sheet tab.
+
+    Open escalations are measured up to `as_of` (ISO date-time), by default
+    the current time rounded down to the rule clock step.
+    """
+    evaluated_at = parse_time(as_of) if as_of else rule_clock()
+    if evaluated_at is None:
+        return JSONResponse(status_code=400, content={"error": f"Invalid as_of: {as_of}"})
+
+    snapshot = get_snapshot()
+    etag = f'"{snapshot["version"]}-{evaluated_at:%Y%m%dT%H%M%S}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    thresholds = load_governance_thresholds()
+    with span("governance_rules"):
+        violations = evaluate_snapshot(snapshot, thresholds, SHEET_NAMES, evaluated_at)
+    if project:
+        violations = [v for v in violations if normalize_project(v["project"]) == normalize_project(project)]
+    return Response(
+        content=json.dumps({"as_of": evaluated_at.replace(tzinfo=BUSINESS_TIMEZONE).isoformat(), "thresholds": thresholds, "violations": violations}),
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
 
-    def eval_status(row):
-        t = " ".join([str(v).lower() for v in row.values()])
-        if any(k in t for k in keywords): return "YES"
-        if any(k in t for k in resolutions): return "NO"
-        return "TBD"
+@app.get("/risk-report/digests")
+def get_risk_digests(project: list[str] = Query(None)):
+    """Stored per-project risk digests and the outcome of the last portfolio scan"""
+    return {"last_scan": last_scan(), "digests": get_digests(project)}
+
+@app.get("/risk-report/digests/{project_name}")
+def get_risk_digest(project_name: str):
+    digests = get_digests([project_name])
+    if not digests:
+        return JSONResponse(status_code=404, content={"error": f"No digest for project: {project_name}"})
+    return digests[0]
+
+@app.post("/risk-report/digests/scan")
+async def run_digest_scan():
+    """Scan now instead of waiting for the next scheduled run"""
+    rebuilt = await scan_portfolio()
+    if rebuilt is None:
+        return JSONResponse(status_code=409, content={"error": "A portfolio scan is already running"})
+    return {"rebuilt": rebuilt, "last_scan": await upstream.run_blocking(last_scan)}
+
+# Rendered PDFs are cached per snapshot version (LRU) and streamed from memory
+PDF_CACHE_SIZE = int(os.getenv("PDF_CACHE_SIZE", "16"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+
+_pdf_cache = OrderedDict()
+_pdf_cache_lock = threading.Lock()
+_pdf_pool = None
+
+def cached_pdf(key, render):
+    with _pdf_cache_lock:
+        hit = key in _pdf_cache
+        cache_result("pdf", hit)
+        if hit:
+            _pdf_cache.move_to_end(key)
+            return _pdf_cache[key]
+    with span("pdf_render"):
+        data = render()
+    with _pdf_cache_lock:
+        _pdf_cache[key] = data
+        while len(_pdf_cache) > PDF_CACHE_SIZE:
+            _pdf_cache.popitem(last=False)
+    return data
+
+def pdf_pool():
+    global _pdf_pool
+    if _pdf_pool is None:
+        # spawn: workers import only report_pdf, not the app and its clients
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pdf_pool
+
+def discard_pdf_pool(pool):
+    """Drop a pool whose worker died; a broken pool rejects every later job"""
+    global _pdf_pool
+    if _pdf_pool is pool:
+        _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+async def render_batch_items(items):
+    """Render batch items in the process pool, retrying once on a fresh pool
+    if a worker died (e.g. OOM-killed); raises BrokenProcessPool otherwise"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = pdf_pool()
+        try:
+            return await asyncio.gather(*[
+                loop.run_in_executor(pool, render_batch_item, item) for item in items
+            ])
+        except BrokenProcessPool:
+            discard_pdf_pool(pool)
+            if attempt:
+                raise
+
+def stream_bytes(data, chunk_size=64 * 1024):
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+def download_response(data, filename, media_type, etag):
+    return StreamingResponse(
+        stream_bytes(data),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(len(data)),
+            "ETag": etag,
+        },
+    )
 
+def scope_creep_pdf_rows(report):
+    """Summary, signal and corrective rows in the shape render_scope_creep_pdf draws"""
     summary = [
         {
             "Project Name": row.get("Project Name", ""),
             "BU": row.get("BU", ""),
             "Solution Center": row.get("Solution Center", ""),
-            "SCOPE CREEP SIGNAL": eval_status(row)
+            "SCOPE CREEP SIGNAL": status
         }
-        for row in index_data
-    ]
-
-    signals = [
-        r for r in extractor_data + manager_data
-        if any(k in str(r.get("Insights", "")).lower() for k in keywords)
-    ]
-
-    corrective = [
-        r for r in extractor_data + manager_data
-        if any(k in str(r.get("Insights", "")).lower() for k in resolutions)
+        for row, status in report.summary
     ]
+    signals = [{k: r.get(k, "") for k in LOG_COLUMNS} for r in report.signals]
+    corrective = [{k: r.get(k, "") for k in LOG_COLUMNS} for r in report.corrective]
+    return summary, signals, corrective
+
+def scope_creep_batches(report, group_by):
+    """One (name, summary, signals, corrective) render job per project or BU"""
+    summary, signals, corrective = scope_creep_pdf_rows(report)
+    bu_of = {normalize_project(r["Project Name"]): r["BU"] for r in summary}
+
+    def group_of_project(project):
+        project = normalize_project(project)
+        return project if group_by == "project" else normalize_project(bu_of.get(project, ""))
+
+    groups = OrderedDict()
+    for r in summary:
+        name = r["Project Name"] if group_by == "project" else r["BU"]
+        if str(name).strip():
+            groups.setdefault(normalize_project(name), (str(name).strip(), [], [], []))[1].append(r)
+    for position, sources, rows in ((2, report.signals, signals), (3, report.corrective, corrective)):
+        for source, r in zip(sources, rows):
+            project = source.get("Project") or source.get("Project Name", "")
+            group = groups.get(group_of_project(project))
+            if group is not None:
+                group[position].append(r)
+    return list(groups.values())
 
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    c = canvas.Canvas(temp_file.name, pagesize=A4)
-    width, height = A4
-    y = height - 50
-
-    def draw_header(title):
-        nonlocal y
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(40, y, title)
-        y -= 30
-
-    def draw_table(headers, rows, bullet_colors=None):
-        nonlocal y
-        c.setFont("Helvetica-Bold", 11)
-        x_pos = [40, 200, 350, 480]
-        for i, h in enumerate(headers):
-            c.drawString(x_pos[i], y, h)
-        y -= 18
-        c.setFont("Helvetica", 10)
-        for row in rows:
-            if y < 100:
-                c.showPage()
-                y = height - 50
-            for i, k in enumerate(headers):
-                t = str(row.get(k, ""))
-                if bullet_colors and i == len(headers) - 1:
-                    c.setFillColor(bullet_colors.get(t, colors.grey))
-                    c.circle(x_pos[i] - 10, y + 3, 5, fill=1)
-                    c.setFillColor(colors.black)
-                c.drawString(x_pos[i], y, t)
-            y -= 15
-
-    def draw_log(title, rows):
-        nonlocal y
-        draw_header(title)
-        headers = ["Project", "Mode", "Date", "Insights"]
-        x_pos = [40, 150, 250, 320]
-        c.setFont("Helvetica-Bold", 11)
-        for i, h in enumerate(headers):
-            c.drawString(x_pos[i], y, h)
-        y -= 18
-        c.setFont("Helvetica", 10)
-        for row in rows:
-            if y < 100:
-                c.showPage()
-                y = height - 50
-            for i, k in enumerate(headers):
-                c.drawString(x_pos[i], y, str(row.get(k, ""))[:90])
-            y -= 15
-
-    draw_header("Scope Creep Summary Report")
-    draw_header("A.1 Summary View")
-    draw_table(
-        ["Project Name", "BU", "Solution Center", "SCOPE CREEP SIGNAL"],
-        summary,
-        bullet_colors={"YES": colors.red, "NO": colors.green, "TBD": colors.gray}
-    )
-    draw_log("A.2 Scope Creep Signal Log", signals)
-    draw_log("A.3 Corrective Measures Taken Log", corrective)
-
-    c.showPage()
-    c.save()
-    return FileResponse(temp_file.name, filename="ScopeCreepSummary.pdf", media_type="application/pdf")
-
+@app.get("/risk-report/scope-creep/pdf")
+def generate_scope_creep_pdf(request: Request):
+    # Generates the A1, A2, A3 sectioned report as PDF
+    snapshot = get_snapshot()
+    etag = f'"{snapshot["version"]}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    def render():
+        report = get_report(get_index(snapshot))
+        return render_scope_creep_pdf(*scope_creep_pdf_rows(report))
+
+    pdf = cached_pdf((snapshot["version"], "all"), render)
+    return download_response(pdf, "ScopeCreepSummary.pdf", "application/pdf", etag)
+
+@app.get("/risk-report/scope-creep/pdf/batch")
+async def generate_scope_creep_pdf_batch(request: Request, group_by: str = "project"):
+    """Zip with one scope-creep PDF per project (or per BU), rendered in a process pool"""
+    if group_by not in ("project", "bu"):
+        return JSONResponse(status_code=400, content={"error": "group_by must be 'project' or 'bu'"})
+
+    snapshot = await upstream.run_blocking(get_snapshot)
+    etag = f'"{snapshot["version"]}-{group_by}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    key = (snapshot["version"], f"batch:{group_by}")
+    with _pdf_cache_lock:
+        archive = _pdf_cache.get(key)
+
+    if archive is None:
+        report = await upstream.run_blocking(lambda: get_report(get_index(snapshot)))
+        batches = await upstream.run_blocking(scope_creep_batches, report, group_by)
+        try:
+            with span("pdf_batch_render"):
+                named_pdfs = await render_batch_items(batches)
+        except BrokenProcessPool:
+            return JSONResponse(status_code=503, content={"error": "PDF rendering workers failed, try again"})
+        archive = await upstream.run_blocking(cached_pdf, key, lambda: zip_pdfs(named_pdfs))
+
+    return download_response(archive, f"ScopeCreepBy{group_by.title()}.zip", "application/zip", etag)
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of stage timings, cache and upstream counters"""
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4")
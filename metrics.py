@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# In-process metrics: stage timing spans, counters and a Prometheus text
+# exposition. Spans recorded while serving a request are also collected per
+# request for the Server-Timing header and sampled trace logs.
+PREFIX = "risk_report_"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+trace_logger = logging.getLogger("risk_report.trace")
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_help = {}
+
+# Spans of the request being served; asyncio.to_thread copies the context, so
+# spans recorded in worker threads land in the same list
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name, text):
+    _help[name] = text
+
+
+def inc(name, value=1, **labels):
+    """Add to a counter, e.g. inc("cache_hits_total", cache="sheets")"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Record a value in a histogram with the default latency buckets"""
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                hist[0][i] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+def cache_result(cache, hit):
+    inc("cache_hits_total" if hit else "cache_misses_total", cache=cache)
+
+
+@contextmanager
+def span(stage):
+    """Time a hot-path stage: feeds stage_duration_seconds and Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("stage_duration_seconds", elapsed, stage=stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def server_timing(spans, total=None):
+    """Server-Timing header value; repeated stages are summed"""
+    durations = {}
+    for stage, elapsed in spans:
+        durations[stage] = durations.get(stage, 0.0) + elapsed
+    if total is not None:
+        durations["total"] = total
+    return ", ".join(
+        f"{re.sub(r'[^A-Za-z0-9_-]', '_', stage)};dur={elapsed * 1000:.1f}"
+        for stage, elapsed in durations.items()
+    )
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, (list(v[0]), v[1], v[2])) for k, v in _histograms.items())
+
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {PREFIX}{name} {_help[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+        lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+
+    for (name, labels), (buckets, total, count) in histograms:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {PREFIX}{name} {_help[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+        for bound, bucket_count in zip(BUCKETS, buckets):
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', repr(bound))])} {bucket_count}")
+        lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{PREFIX}{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class TimingMiddleware:
+    """ASGI middleware: per-request span collection, request metrics,
+    a Server-Timing response header and sampled trace logs"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        spans = []
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(spans, total=time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            elapsed = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", "unmatched")
+            observe("request_duration_seconds", elapsed, route=route, method=scope["method"])
+            inc("requests_total", route=route, method=scope["method"], status=status)
+            if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE:
+                trace_logger.info(json.dumps({
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "spans": [(stage, round(duration * 1000, 1)) for stage, duration in spans],
+                }))
+
+
+describe("stage_duration_seconds", "Time spent in each hot-path stage")
+describe("request_duration_seconds", "End-to-end request latency by route")
+describe("requests_total", "Requests served by route and status")
+describe("rows_scanned_total", "Sheet or log rows processed, by stage")
+describe("cache_hits_total", "Cache hits by cache")
+describe("cache_misses_total", "Cache misses by cache")
+describe("upstream_requests_total", "Outbound calls by upstream")
+describe("upstream_retries_total", "Outbound calls retried, by upstream")
+describe("upstream_errors_total", "Outbound calls that failed after retries, by upstream")
+describe("upstream_wait_seconds", "Time calls were held back by an upstream's rate limit")
+describe("upstream_circuit_open_total", "Times an upstream's circuit breaker opened")
+describe("chat_context_chars_total", "Characters of context sent with chats")
+describe("chat_context_tokens_total", "Tokens of context sent with chats")
@@ -0,0 +1,336 @@
+import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+from contextlib import asynccontextmanager
+import httpx
+from metrics import inc, observe
+
+# Outbound scheduling shared by every call to one upstream:
+# - a token bucket (configured steady rate, tightened by the upstream's
+#   rate-limit headers and paused by 429 Retry-After)
+# - retries with exponential backoff and full jitter
+# - a circuit breaker that fails fast while the upstream keeps failing
+# - for async callers, a priority gate so interactive work goes first
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+RETRY_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "4"))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "20"))
+CIRCUIT_FAILURES = int(os.getenv("UPSTREAM_CIRCUIT_FAILURES", "5"))
+CIRCUIT_RESET = float(os.getenv("UPSTREAM_CIRCUIT_RESET", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Google reports quota exhaustion as 403 with one of these reasons
+GOOGLE_RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded", b"RATE_LIMIT_EXCEEDED")
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is failing; retry_after is in seconds"""
+
+    def __init__(self, upstream, retry_after):
+        super().__init__(f"{upstream} is temporarily unavailable, retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def parse_duration(value):
+    """Seconds from "7.66s", "2m59.56s", "120ms" or a bare number, else None"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(str(value))
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Client-side request budget for one upstream (thread-safe).
+
+    reserve() books the next request and returns how long the caller must
+    wait before sending it, so concurrent callers are spread out in time
+    instead of being rejected.
+    """
+
+    def __init__(self, rate=0.0, burst=1):
+        self.rate = rate                # requests per second, 0 = no steady limit
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._tat = 0.0                 # theoretical arrival time (GCRA)
+        self._paused_until = 0.0
+        self._window_remaining = None   # from x-ratelimit-remaining-requests
+        self._window_reset = 0.0
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._paused_until)
+            if self._window_remaining is not None:
+                if now >= self._window_reset:
+                    self._window_remaining = None
+                elif self._window_remaining <= 0:
+                    start = max(start, self._window_reset)
+                    self._window_remaining = None
+                else:
+                    self._window_remaining -= 1
+            if self.rate > 0:
+                interval = 1 / self.rate
+                start = max(start, self._tat - (self.burst - 1) * interval)
+                self._tat = max(self._tat, start) + interval
+            return start - now
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def update(self, headers):
+        """Adjust to the upstream's view of our quota (OpenAI/Groq-style headers)"""
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is None or reset is None:
+                continue
+            try:
+                remaining = int(float(remaining))
+            except ValueError:
+                continue
+            if remaining <= 0:
+                self.pause(reset)
+            elif kind == "requests":
+                with self._lock:
+                    self._window_remaining = remaining
+                    self._window_reset = time.monotonic() + reset
+        retry_after = parse_duration(headers.get("retry-after"))
+        if retry_after:
+            self.pause(retry_after)
+
+
+class CircuitBreaker:
+    """Opens after CIRCUIT_FAILURES consecutive failures; after CIRCUIT_RESET
+    seconds a single trial call is let through to decide whether to close.
+    A trial that never reports back (e.g. cancelled) expires after CIRCUIT_RESET."""
+
+    def __init__(self, name, failures=CIRCUIT_FAILURES, reset=CIRCUIT_RESET):
+        self.name = name
+        self.threshold = failures
+        self.reset = reset
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._trial_started = 0.0
+
+    def check(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.monotonic()
+            remaining = self._opened_at + self.reset - now
+            if remaining > 0 or self._trial_running and now - self._trial_started < self.reset:
+                raise CircuitOpenError(self.name, max(remaining, 1.0))
+            self._trial_running = True
+            self._trial_started = now
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.threshold:
+                if self._opened_at is None or self._trial_running:
+                    inc("upstream_circuit_open_total", upstream=self.name)
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class PriorityGate:
+    """Concurrency limit whose waiters are admitted by priority, then FIFO.
+
+    Background work may hold at most `background_limit` slots, so a burst of
+    it never occupies every slot ahead of interactive requests.
+    """
+
+    def __init__(self, limit, background_limit):
+        self.limit = limit
+        self.background_limit = background_limit
+        self._active = 0
+        self._active_background = 0
+        self._waiters = []
+        self._order = itertools.count()
+
+    def _eligible(self, priority):
+        if self._active >= self.limit:
+            return False
+        return priority == INTERACTIVE or self._active_background < self.background_limit
+
+    def _admit(self, priority):
+        self._active += 1
+        if priority != INTERACTIVE:
+            self._active_background += 1
+
+    def _release(self, priority):
+        self._active -= 1
+        if priority != INTERACTIVE:
+            self._active_background -= 1
+        while self._waiters:
+            waiter_priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._eligible(waiter_priority):
+                break
+            heapq.heappop(self._waiters)
+            self._admit(waiter_priority)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority=INTERACTIVE):
+        # Releases admit every waiter that fits, so whoever is still queued is
+        # blocked by a limit; a caller that fits now doesn't jump anyone
+        if self._eligible(priority):
+            self._admit(priority)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._order), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # Admitted just as we were cancelled: hand the slot on
+                if future.done() and not future.cancelled():
+                    self._release(priority)
+                raise
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+
+def _backoff(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _google_status(error):
+    """HTTP status of a googleapiclient HttpError, treating quota 403s as 429"""
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status is None:
+        return None
+    status = int(status)
+    if status == 403 and any(reason in (getattr(error, "content", b"") or b"") for reason in GOOGLE_RATE_LIMIT_REASONS):
+        return 429
+    return status
+
+
+class Upstream:
+    """Rate limit, retry policy and circuit breaker for one upstream service"""
+
+    def __init__(self, name, rate=0.0, burst=1, concurrency=None, background_concurrency=None):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(name)
+        self.concurrency = concurrency
+        self.background_concurrency = background_concurrency or max(1, (concurrency or 2) // 2)
+        self._gate = None
+
+    def gate(self):
+        """Priority gate (created lazily inside the running loop)"""
+        if self._gate is None:
+            self._gate = PriorityGate(self.concurrency or float("inf"), self.background_concurrency)
+        return self._gate
+
+    def _reserve(self):
+        delay = self.bucket.reserve()
+        if delay > 0:
+            observe("upstream_wait_seconds", delay, upstream=self.name)
+        return delay
+
+    def _retrying(self, delay):
+        inc("upstream_retries_total", upstream=self.name)
+        return delay
+
+    @asynccontextmanager
+    async def request(self, send, priority=INTERACTIVE):
+        """Send an httpx request with `await send()` under this upstream's limits.
+
+        Retryable statuses and transport errors are retried with backoff; the
+        last response is yielded whatever its status, and closed afterwards.
+        The priority slot is held until the block exits, so streamed bodies
+        count against the concurrency limit while they are being read.
+        """
+        attempt = 0
+        while True:
+            self.breaker.check()
+            async with self.gate().slot(priority):
+                delay = self._reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    response = await send()
+                except httpx.TransportError:
+                    self.breaker.failure()
+                    if attempt >= RETRY_ATTEMPTS:
+                        raise
+                    retry_in = self._retrying(_backoff(attempt))
+                else:
+                    self.bucket.update(response.headers)
+                    status = response.status_code
+                    # A 429 is the limiter's business; the upstream itself is up
+                    if status >= 500:
+                        self.breaker.failure()
+                    else:
+                        self.breaker.success()
+                    if status not in RETRY_STATUSES or attempt >= RETRY_ATTEMPTS:
+                        try:
+                            yield response
+                        finally:
+                            await response.aclose()
+                        return
+                    await response.aclose()
+                    # A 429 already paused the bucket for Retry-After
+                    retry_in = self._retrying(_backoff(attempt))
+            await asyncio.sleep(retry_in)
+            attempt += 1
+
+    def call(self, func):
+        """Run a blocking googleapiclient call, e.g. call(request.execute)"""
+        attempt = 0
+        while True:
+            self.breaker.check()
+            delay = self._reserve()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                result = func()
+            except Exception as e:
+                status = _google_status(e)
+                transport_error = status is None and isinstance(e, OSError)
+                if transport_error or (status or 0) >= 500:
+                    self.breaker.failure()
+                elif status is not None:
+                    self.breaker.success()
+                if status == 429:
+                    self.bucket.pause(BACKOFF_BASE * 2 ** attempt)
+                retryable = status in RETRY_STATUSES or transport_error
+                if not retryable or attempt >= RETRY_ATTEMPTS:
+                    raise
+                time.sleep(self._retrying(_backoff(attempt)))
+                attempt += 1
+                continue
+            self.breaker.success()
+            return result
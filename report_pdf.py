@@ -0,0 +1,105 @@
+import io
+import re
+import zipfile
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.pdfgen import canvas
+from scope_classifier import LOG_COLUMNS
+
+# Kept free of app and Google client imports: process-pool workers are
+# spawned and import only this module.
+
+SUMMARY_COLUMNS = ["Project Name", "BU", "Solution Center", "SCOPE CREEP SIGNAL"]
+
+
+def render_scope_creep_pdf(summary, signals, corrective, title="Scope Creep Summary Report") -> bytes:
+    """Draws the A1, A2, A3 sectioned report into an in-memory PDF"""
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    y = height - 50
+
+    def draw_header(title):
+        nonlocal y
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(40, y, title)
+        y -= 30
+
+    def draw_table(headers, rows, bullet_colors=None):
+        nonlocal y
+        c.setFont("Helvetica-Bold", 11)
+        x_pos = [40, 200, 350, 480]
+        for i, h in enumerate(headers):
+            c.drawString(x_pos[i], y, h)
+        y -= 18
+        c.setFont("Helvetica", 10)
+        for row in rows:
+            if y < 100:
+                c.showPage()
+                y = height - 50
+            for i, k in enumerate(headers):
+                t = str(row.get(k, ""))
+                if bullet_colors and i == len(headers) - 1:
+                    c.setFillColor(bullet_colors.get(t, colors.grey))
+                    c.circle(x_pos[i] - 10, y + 3, 5, fill=1)
+                    c.setFillColor(colors.black)
+                c.drawString(x_pos[i], y, t)
+            y -= 15
+
+    def draw_log(title, rows):
+        nonlocal y
+        draw_header(title)
+        headers = LOG_COLUMNS
+        x_pos = [40, 150, 250, 320]
+        c.setFont("Helvetica-Bold", 11)
+        for i, h in enumerate(headers):
+            c.drawString(x_pos[i], y, h)
+        y -= 18
+        c.setFont("Helvetica", 10)
+        for row in rows:
+            if y < 100:
+                c.showPage()
+                y = height - 50
+            for i, k in enumerate(headers):
+                c.drawString(x_pos[i], y, str(row.get(k, ""))[:90])
+            y -= 15
+
+    draw_header(title)
+    draw_header("A.1 Summary View")
+    draw_table(
+        SUMMARY_COLUMNS,
+        summary,
+        bullet_colors={"YES": colors.red, "NO": colors.green, "TBD": colors.gray}
+    )
+    draw_log("A.2 Scope Creep Signal Log", signals)
+    draw_log("A.3 Corrective Measures Taken Log", corrective)
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def render_batch_item(item):
+    """Process-pool entry point: (name, summary, signals, corrective) -> (name, pdf bytes)"""
+    name, summary, signals, corrective = item
+    return name, render_scope_creep_pdf(summary, signals, corrective, title=f"Scope Creep Report: {name}")
+
+
+def safe_filename(name):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "unnamed"
+
+
+def zip_pdfs(named_pdfs) -> bytes:
+    """Bundle (name, pdf bytes) pairs into an in-memory zip archive"""
+    buffer = io.BytesIO()
+    used = set()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, pdf in named_pdfs:
+            filename = f"ScopeCreep_{safe_filename(name)}"
+            suffix = 1
+            while filename in used:
+                suffix += 1
+                filename = f"ScopeCreep_{safe_filename(name)}_{suffix}"
+            used.add(filename)
+            archive.writestr(f"{filename}.pdf", pdf)
+    return buffer.getvalue()
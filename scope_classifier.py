@@ -0,0 +1,154 @@
+import json
+import threading
+from array import array
+from metrics import inc, span
+
+# Keyword sets shared by the scope-creep report endpoints and /chat
+SCOPE_CREEP_KEYWORDS = ["scope creep", "not in scope", "added", "new", "expanded"]
+RESOLUTION_KEYWORDS = ["approved", "acknowledged", "taken care", "phase 2"]
+CONCERN_KEYWORDS = ["issue", "delay", "blocked", "escalated"]
+COMPLETED_KEYWORDS = ["100%", "completed", "finalized", "signed off"]
+
+# Per-row flag bits
+CREEP = 1        # scope-creep keyword anywhere in the row
+RESOLVED = 2     # resolution keyword anywhere in the row
+SIGNAL = 4       # scope-creep keyword in "Insights"
+CORRECTIVE = 8   # resolution keyword in "Insights"
+CONCERN = 16     # open concern keyword anywhere in the row
+COMPLETED = 32   # completed milestone keyword anywhere in the row
+
+# Flag for a match in the whole row, and for a match inside "Insights".
+# Each group is tested with plain substring checks: with a handful of short
+# keywords per group, str's C search beats any per-character matcher.
+_KEYWORD_FLAGS = tuple(
+    (tuple(k.lower() for k in keywords), row_flag, insight_flag)
+    for keywords, row_flag, insight_flag in (
+        (SCOPE_CREEP_KEYWORDS, CREEP, SIGNAL),
+        (RESOLUTION_KEYWORDS, RESOLVED, CORRECTIVE),
+        (CONCERN_KEYWORDS, CONCERN, 0),
+        (COMPLETED_KEYWORDS, COMPLETED, 0),
+    )
+)
+_INSIGHT_GROUPS = tuple((keywords, flag) for keywords, _, flag in _KEYWORD_FLAGS if flag)
+_INSIGHT_TRIGGERS = CREEP | RESOLVED
+
+
+def classify_row(row, text):
+    """Flag bits for one row, given its lowercased text (see sheet_index.row_text)"""
+    flags = 0
+    for keywords, row_flag, _ in _KEYWORD_FLAGS:
+        for keyword in keywords:
+            if keyword in text:
+                flags |= row_flag
+                break
+
+    # "Insights" is part of the row text, so it can only hold a creep or
+    # resolution keyword when the row as a whole does
+    if flags & _INSIGHT_TRIGGERS:
+        insights = str(row.get("Insights", "")).lower()
+        for keywords, insight_flag in _INSIGHT_GROUPS:
+            for keyword in keywords:
+                if keyword in insights:
+                    flags |= insight_flag
+                    break
+    return flags
+
+
+def scope_creep_status(flags):
+    if flags & CREEP:
+        return "YES"
+    if flags & RESOLVED:
+        return "NO"
+    return "TBD"
+
+
+LOG_COLUMNS = ["Project", "Mode", "Date", "Insights"]
+
+
+def row_fingerprint(row):
+    """Hashable identity of a row's content; equal rows classify identically"""
+    return tuple(row.items())
+
+
+class ScopeCreepReport:
+    """Materialized scope-creep view of one snapshot.
+
+    - flags[key][i]: flag bits of row i of each tab
+    - summary: (index row, status) for every project in the Index tab
+    - signals / corrective: Email Extractor + Email Manager rows whose
+      Insights mention scope creep / a resolution
+
+    Built incrementally from the previous report: rows whose content is
+    unchanged reuse their flags, only new or edited rows are classified.
+    """
+
+    def __init__(self, index, previous=None):
+        self.version = index.version
+        self.flags = {}
+        self.reclassified = 0
+        self._json = None
+
+        known = previous._flags_by_row if previous is not None else {}
+        self._flags_by_row = {}
+        for key, rows in index.rows.items():
+            texts = index.texts[key]
+            flags = array("B")
+            for i, row in enumerate(rows):
+                fingerprint = row_fingerprint(row)
+                row_flags = known.get(fingerprint)
+                if row_flags is None:
+                    row_flags = classify_row(row, texts[i])
+                    self.reclassified += 1
+                self._flags_by_row[fingerprint] = row_flags
+                flags.append(row_flags)
+            self.flags[key] = flags
+
+        self.summary = [
+            (row, scope_creep_status(flags))
+            for row, flags in zip(index.rows["index"], self.flags["index"])
+        ]
+
+        self.signals = []
+        self.corrective = []
+        for key in ("extractor", "manager"):
+            for row, flags in zip(index.rows[key], self.flags[key]):
+                if flags & SIGNAL:
+                    self.signals.append(row)
+                if flags & CORRECTIVE:
+                    self.corrective.append(row)
+
+    def summary_json(self):
+        """JSON body of /risk-report/scope-creep/summary, serialized once per version"""
+        if self._json is None:
+            self._json = json.dumps({
+                "summary": [
+                    {
+                        "project": row.get("Project Name", ""),
+                        "bu": row.get("BU", ""),
+                        "solution_center": row.get("Solution Center", ""),
+                        "status": status
+                    }
+                    for row, status in self.summary
+                ],
+                "signals": [{k: r.get(k, "") for k in LOG_COLUMNS} for r in self.signals],
+                "corrective": [{k: r.get(k, "") for k in LOG_COLUMNS} for r in self.corrective],
+            }, ensure_ascii=False).encode("utf-8")
+        return self._json
+
+
+_report = None
+_report_lock = threading.Lock()
+
+
+def get_report(index):
+    """Report for the index's snapshot, rebuilt only when its version changes"""
+    global _report
+    report = _report
+    if report is not None and report.version == index.version:
+        return report
+    with _report_lock:
+        if _report is None or _report.version != index.version:
+            with span("classify"):
+                _report = ScopeCreepReport(index, previous=_report)
+            inc("rows_scanned_total", _report.reclassified, stage="classify")
+        return _report
@@ -0,0 +1,144 @@
+import re
+import heapq
+import threading
+from bisect import bisect_right
+from collections import Counter
+from itertools import chain, islice
+from text_match import KeywordMatcher
+from metrics import inc, span
+
+# Tabs whose "Project Name" column defines the set of known projects
+PROJECT_SOURCES = ("index", "manager")
+
+
+def normalize_project(name):
+    return str(name).strip().lower()
+
+
+_TERM_PATTERN = re.compile(r"[a-z0-9%]+")
+
+
+def terms(text):
+    """Search terms of already-lowercased text"""
+    return _TERM_PATTERN.findall(text)
+
+
+def row_text(row):
+    """Lowercased text of all cell values, used for keyword checks"""
+    return " ".join([str(cell).lower() for cell in row.values()])
+
+
+class SheetIndex:
+    """Lookup structures built once per sheet snapshot.
+
+    - rows[key]: the snapshot rows of each tab
+    - texts[key][i]: lowercased text of row i
+    - by_project[key][name]: row ids for a normalized project name,
+      newest "Date" first
+    - matcher: keyword automaton over all known project names
+    """
+
+    def __init__(self, snapshot):
+        with span("index_build"):
+            self._build(snapshot)
+        inc("rows_scanned_total", sum(len(rows) for rows in self.rows.values()), stage="index_build")
+
+    def _build(self, snapshot):
+        self.version = snapshot["version"]
+        self.rows = snapshot["sheets"]
+        self.texts = {}
+        self.by_project = {}
+        self.project_names = {}
+
+        for key, rows in self.rows.items():
+            self.texts[key] = [row_text(row) for row in rows]
+
+            # Rank rows by date once; per-project lists inherit that order
+            order = sorted(range(len(rows)), key=lambda i: rows[i].get("Date", ""), reverse=True)
+            projects = {}
+            for i in order:
+                name = normalize_project(rows[i].get("Project Name", ""))
+                if name:
+                    projects.setdefault(name, []).append(i)
+            self.by_project[key] = projects
+
+            if key in PROJECT_SOURCES:
+                for row in rows:
+                    name = str(row.get("Project Name", "")).strip()
+                    if name:
+                        self.project_names.setdefault(name.lower(), name)
+
+        self.matcher = KeywordMatcher(self.project_names.keys())
+        self._term_stats = None
+        self._term_stats_lock = threading.Lock()
+
+    def term_stats(self):
+        """(document frequency per term, row count, average row length in terms)
+        over every row of every tab, computed on first use"""
+        if self._term_stats is None:
+            with self._term_stats_lock:
+                if self._term_stats is None:
+                    with span("term_stats"):
+                        df, docs, total = Counter(), 0, 0
+                        for texts in self.texts.values():
+                            for text in texts:
+                                row_terms = terms(text)
+                                df.update(set(row_terms))
+                                docs += 1
+                                total += len(row_terms)
+                        self._term_stats = (df, docs, total / docs if docs else 0.0)
+        return self._term_stats
+
+    def match_projects(self, message):
+        """Project names mentioned anywhere in the message"""
+        return [self.project_names[name] for name in self.matcher.find(message.lower())]
+
+    def project_row_ids(self, key, project_names, limit=None):
+        """Row ids of a tab for the given projects, newest first"""
+        rows = self.rows[key]
+        lists = [
+            self.by_project[key].get(normalize_project(name), [])
+            for name in dict.fromkeys(project_names)
+        ]
+        merged = heapq.merge(*lists, key=lambda i: rows[i].get("Date", ""), reverse=True)
+        return list(islice(merged, limit))
+
+    def select_row_ids(self, key, project_names=None, since=None, until=None, after=-1, limit=None):
+        """Row ids of a tab in sheet order, starting after row id `after`.
+
+        Rows can be restricted to the given projects and to an inclusive
+        "Date" range; dates compare as strings, so ISO dates (or a prefix of
+        them, e.g. "2024-03") work as bounds.
+        """
+        rows = self.rows[key]
+        if project_names:
+            ids = sorted(set(chain.from_iterable(
+                self.by_project[key].get(normalize_project(name), []) for name in project_names
+            )))
+            candidates = islice(ids, bisect_right(ids, after), None)
+        else:
+            candidates = range(after + 1, len(rows))
+
+        if since or until:
+            def in_range(i):
+                date = str(rows[i].get("Date", ""))
+                return (not since or date >= since) and (not until or date[:len(until)] <= until)
+            candidates = filter(in_range, candidates)
+
+        return list(islice(candidates, limit))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(snapshot):
+    """Index for the given snapshot, rebuilt only when its version changes"""
+    global _index
+    index = _index
+    if index is not None and index.version == snapshot["version"]:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != snapshot["version"]:
+            _index = SheetIndex(snapshot)
+        return _index
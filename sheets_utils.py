@@ -1,16 +1,31 @@
 import os
+import json
+import time
+import hashlib
+import logging
+import threading
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from metrics import cache_result, inc, span
+from file_lock import file_lock
+from upstream import google_call
 
 # Load credentials
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
 SERVICE_ACCOUNT_FILE = 'google-sheets-access.json'
 
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE, scopes=SCOPES
-)
+# The client is built on first use, so the module imports without the
+# credentials file; offline tools (benchmarks) assign a stub to `service`.
+service = None
 
-service = build('sheets', 'v4', credentials=credentials)
+def _sheets_service():
+    global service
+    if service is None:
+        credentials = service_account.Credentials.from_service_account_file(
+            SERVICE_ACCOUNT_FILE, scopes=SCOPES
+        )
+        service = build('sheets', 'v4', credentials=credentials)
+    return service
 
 # Sheet configuration
 SPREADSHEET_ID = '1icAbeQevZL6A-_glzEk3f6uF9OaAZfyqnUHgQVjRMPY'
@@ -20,26 +35,193 @@ SHEET_NAMES = {
     "manager": "Email Manager"
 }
 
-def fetch_sheet_data(sheet_name_key):
+# Snapshot cache: all tabs are pulled together and served from memory.
+# Once a snapshot is older than the TTL, readers still get it while a
+# background thread fetches the next one (stale-while-revalidate).
+#
+# Snapshots are shared by every worker process through SNAPSHOT_DIR: one file
+# per version plus a `current.json` pointer. The worker that wins a file lock
+# fetches from Google and publishes; the others only notice the pointer moved
+# and load the new version from disk, so upstream calls don't scale with the
+# number of workers.
+CACHE_TTL = float(os.getenv("SHEETS_CACHE_TTL", "60"))
+SNAPSHOT_DIR = os.getenv("SHEETS_SNAPSHOT_DIR", os.path.join(".cache", "sheets"))
+_POINTER_PATH = os.path.join(SNAPSHOT_DIR, "current.json")
+_LOCK_PATH = os.path.join(SNAPSHOT_DIR, "refresh.lock")
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_refresh_running = False
+_pointer = (None, None, 0.0)  # (stat key, version, fetched_at)
+
+logger = logging.getLogger("risk_report.sheets")
+
+
+def _rows_from_values(values):
+    if not values:
+        return []
+    headers = values[0]
+    return [dict(zip(headers, row)) for row in values[1:]]
+
+
+def _snapshot_path(version):
+    return os.path.join(SNAPSHOT_DIR, f"snapshot-{version}.json")
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_pointer():
+    """(version, fetched_at) of the published snapshot, or None before the first fetch.
+
+    The pointer file is only re-read when its inode or mtime changes, so the
+    per-request cost is a single stat().
+    """
+    global _pointer
     try:
-        sheet_name = SHEET_NAMES.get(sheet_name_key)
-        if not sheet_name:
-            return {"error": f"Invalid sheet name key: {sheet_name_key}"}
+        st = os.stat(_POINTER_PATH)
+    except FileNotFoundError:
+        return None
+    stat_key = (st.st_ino, st.st_mtime_ns)
+    cached = _pointer
+    if cached[0] != stat_key:
+        with open(_POINTER_PATH) as f:
+            pointer = json.load(f)
+        cached = _pointer = (stat_key, pointer["version"], pointer["fetched_at"])
+    return cached[1], cached[2]
 
-        result = service.spreadsheets().values().get(
+
+def _load_snapshot():
+    """Pull every configured tab with a single batchGet round trip"""
+    keys = list(SHEET_NAMES.keys())
+    inc("upstream_requests_total", upstream="sheets")
+    with span("sheets_fetch"):
+        result = google_call("sheets", _sheets_service().spreadsheets().values().batchGet(
             spreadsheetId=SPREADSHEET_ID,
-            range=sheet_name
-        ).execute()
+            ranges=[SHEET_NAMES[k] for k in keys]
+        ))
+
+    # valueRanges come back in the same order as the requested ranges
+    value_ranges = result.get("valueRanges", [])
+    raw = {key: vr.get("values", []) for key, vr in zip(keys, value_ranges)}
+    payload = json.dumps(raw, sort_keys=True).encode("utf-8")
+    return _snapshot_from_values(hashlib.sha1(payload).hexdigest()[:16], time.time(), raw), payload
+
+
+def _snapshot_from_values(version, fetched_at, raw):
+    return {
+        "version": version,
+        "fetched_at": fetched_at,
+        "sheets": {key: _rows_from_values(values) for key, values in raw.items()},
+    }
+
+
+def _read_snapshot(version, fetched_at):
+    """Load a published snapshot from disk, or None if it was already pruned"""
+    try:
+        with span("snapshot_load"), open(_snapshot_path(version), "rb") as f:
+            return _snapshot_from_values(version, fetched_at, json.loads(f.read()))
+    except FileNotFoundError:
+        return None
 
-        values = result.get("values", [])
-        if not values:
-            return {"data": []}
 
-        headers = values[0]
-        rows = values[1:]
-        data = [dict(zip(headers, row)) for row in rows]
+def _fetch_and_publish():
+    """Fetch from Google and publish for every worker; caller holds the file lock"""
+    global _snapshot
+    snapshot, payload = _load_snapshot()
+    previous = _read_pointer()
+    path = _snapshot_path(snapshot["version"])
+    if not os.path.exists(path):
+        _write_atomic(path, payload)
+    _write_atomic(_POINTER_PATH, json.dumps(
+        {"version": snapshot["version"], "fetched_at": snapshot["fetched_at"]}
+    ).encode("utf-8"))
 
-        return {"data": data}
+    # Keep the previous version too: another worker may be loading it right now
+    keep = {os.path.basename(path)}
+    if previous is not None:
+        keep.add(os.path.basename(_snapshot_path(previous[0])))
+    for name in os.listdir(SNAPSHOT_DIR):
+        if name.startswith("snapshot-") and name.endswith(".json") and name not in keep:
+            try:
+                os.remove(os.path.join(SNAPSHOT_DIR, name))
+            except FileNotFoundError:
+                pass
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot["version"] != snapshot["version"]:
+            _snapshot = snapshot
+    return snapshot
+
+
+def _refresh_in_background():
+    global _refresh_running
+    try:
+        with file_lock(_LOCK_PATH, blocking=False) as elected:
+            # Losing the election means another worker is already fetching
+            if elected:
+                pointer = _read_pointer()
+                if pointer is None or time.time() - pointer[1] > CACHE_TTL:
+                    _fetch_and_publish()
     except Exception as e:
-        return {"error": str(e)}
+        # Keep serving the previous snapshot; the next stale read retries
+        inc("upstream_errors_total", upstream="sheets")
+        snapshot = _snapshot
+        age = time.time() - snapshot["fetched_at"] if snapshot is not None else float("nan")
+        logger.warning("sheet refresh failed, serving a snapshot fetched %.0fs ago: %s", age, e)
+    finally:
+        _refresh_running = False
+
+
+def get_snapshot():
+    """Return the current sheet snapshot: {"version", "fetched_at", "sheets"}.
+
+    The first call (across all workers) blocks on the fetch. Afterwards reads
+    never wait on the Sheets API: a stale snapshot is returned immediately and
+    refreshed in the background. `fetched_at` is when this version was first
+    fetched. Row lists are shared between callers and must not be mutated.
+    """
+    global _snapshot, _refresh_running
+
+    pointer = _read_pointer()
+    snapshot = _snapshot
+    if snapshot is None or pointer is None or snapshot["version"] != pointer[0]:
+        with _snapshot_lock:
+            pointer = _read_pointer()
+            if pointer is not None and (_snapshot is None or _snapshot["version"] != pointer[0]):
+                _snapshot = _read_snapshot(*pointer) or _snapshot
+            snapshot = _snapshot
+
+        if snapshot is None or pointer is None or snapshot["version"] != pointer[0]:
+            cache_result("sheets", False)
+            with file_lock(_LOCK_PATH):
+                # Another worker may have published while we waited
+                pointer = _read_pointer()
+                loaded = _read_snapshot(*pointer) if pointer is not None else None
+                snapshot = loaded or _fetch_and_publish()
+            with _snapshot_lock:
+                _snapshot = snapshot
+            return snapshot
 
+    cache_result("sheets", True)
+    if time.time() - pointer[1] > CACHE_TTL and not _refresh_running:
+        with _snapshot_lock:
+            if not _refresh_running:
+                _refresh_running = True
+                threading.Thread(target=_refresh_in_background, daemon=True).start()
+
+    return snapshot
+
+
+def fetch_sheet_data(sheet_name_key):
+    try:
+        if sheet_name_key not in SHEET_NAMES:
+            return {"error": f"Invalid sheet name key: {sheet_name_key}"}
+
+        return {"data": get_snapshot()["sheets"][sheet_name_key]}
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,142 @@
+"""emailLogs mirror: incremental JSON parsing and cursor pagination.
+
+Run from the repository root with `python -m unittest discover tests`.
+Pages are served by the Firebase stand-in from benchmarks/fakes.py.
+"""
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from benchmarks.fakes import FakeServer, FirebaseHandler
+from fetchers import firebase
+from fetchers.firebase import iter_object_items
+
+
+DOCUMENT = {
+    "-N1": {"project": "Alpha", "Insights": "scope \"creep\" added", "score": 12345.678},
+    "-N2": {"project": "Bêta ✓", "nested": {"list": [1, 2.5e3, True, False, None], "empty": {}}},
+    "-N3": [],
+    "-N4": -0.5,
+    "-N5": "escaped \\   \\u00e9",
+    "-N6": None,
+}
+
+
+def split_at(data, *cuts):
+    edges = [0, *cuts, len(data)]
+    return [data[a:b] for a, b in zip(edges, edges[1:])]
+
+
+class IterObjectItemsTest(unittest.TestCase):
+
+    def test_every_chunk_boundary(self):
+        data = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode("utf-8")
+        expected = list(DOCUMENT.items())
+        for cut in range(1, len(data)):
+            self.assertEqual(list(iter_object_items(split_at(data, cut))), expected, cut)
+
+    def test_single_byte_chunks(self):
+        data = json.dumps(DOCUMENT, ensure_ascii=False).encode("utf-8")
+        chunks = [data[i:i + 1] for i in range(len(data))]
+        self.assertEqual(list(iter_object_items(chunks)), list(DOCUMENT.items()))
+
+    def test_number_split_across_chunks(self):
+        self.assertEqual(list(iter_object_items([b'{"a": 12', b"3.5", b"}"])), [("a", 123.5)])
+
+    def test_null_and_empty_pages(self):
+        self.assertEqual(list(iter_object_items([b"nu", b"ll"])), [])
+        self.assertEqual(list(iter_object_items([b" { ", b"} "])), [])
+
+    def test_malformed_input(self):
+        for chunks in ([b'{"a": 1'], [b'{"a" 1}'], [b'{"a": 1 "b": 2}'], [b"[1, 2]"]):
+            with self.assertRaises(ValueError, msg=chunks):
+                list(iter_object_items(chunks))
+
+
+class SyncEmailLogsTest(unittest.TestCase):
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.tree = {f"-K{i:03d}": {"project": "Alpha" if i % 2 else "Beta", "n": i} for i in range(7)}
+        self.server = FakeServer(FirebaseHandler, tree=self.tree)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        self.queries = []
+        fetch_page = firebase._fetch_page
+
+        def recording_fetch_page(cursor):
+            self.queries.append(cursor)
+            return fetch_page(cursor)
+
+        for name, value in (
+            ("FIREBASE_DB_URL", self.server.url),
+            ("EMAIL_LOG_STORE", os.path.join(workdir.name, "email_logs.sqlite")),
+            ("PAGE_SIZE", 3),
+            ("_local", threading.local()),
+            ("_fetch_page", recording_fetch_page),
+        ):
+            patcher = mock.patch.object(firebase, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: firebase._local.__dict__.pop("conn").close())
+
+    def add_entries(self, *keys):
+        for key in keys:
+            self.tree[key] = {"project": "Alpha", "n": key}
+        # The stand-in sorts the keys once per server
+        self.server.handler.state.pop("sorted_keys", None)
+
+    def stored_keys(self):
+        return [log["key"] for log in firebase.query_email_logs()]
+
+    def test_pages_through_everything(self):
+        self.assertEqual(firebase.sync_email_logs(), 7)
+        self.assertEqual(self.stored_keys(), sorted(self.tree))
+        # 3 + 3 + 1 new entries, each page after the first starting at the cursor
+        self.assertEqual(self.queries, [None, "-K002", "-K005"])
+        self.assertEqual([log["n"] for log in firebase.query_email_logs("alpha")], [1, 3, 5])
+
+    def test_start_at_is_inclusive_and_skipped(self):
+        firebase.sync_email_logs()
+        requests_before = self.server.requests
+        # The cursor entry comes back as the first item of every later page
+        self.assertEqual(firebase.sync_email_logs(), 0)
+        self.assertEqual(self.server.requests, requests_before + 1)
+        self.assertEqual(len(self.stored_keys()), 7)
+
+    def test_resumes_from_cursor(self):
+        firebase.sync_email_logs()
+        self.add_entries("-K007", "-K008", "-K009", "-K010")
+        self.queries.clear()
+
+        self.assertEqual(firebase.sync_email_logs(), 4)
+        self.assertEqual(self.queries, ["-K006", "-K009"])
+        self.assertEqual(self.stored_keys(), sorted(self.tree))
+
+    def test_empty_database(self):
+        self.tree.clear()
+        self.assertEqual(firebase.sync_email_logs(), 0)
+        self.assertEqual(self.stored_keys(), [])
+
+    def test_page_request_parameters(self):
+        seen = []
+        send = firebase._session.get
+
+        def recording_get(url, params=None, **kwargs):
+            seen.append(params)
+            return send(url, params=params, **kwargs)
+
+        with mock.patch.object(firebase._session, "get", recording_get):
+            firebase.sync_email_logs()
+        self.assertEqual(seen[0], {"orderBy": '"$key"', "limitToFirst": 3})
+        # One extra entry per page makes up for the repeated cursor entry
+        self.assertEqual(seen[1], {"orderBy": '"$key"', "limitToFirst": 4, "startAt": '"-K002"'})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+"""LLM response cache: LRU/TTL eviction and single-flight of identical calls.
+
+Run from the repository root with `python -m unittest discover tests`.
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+import llm_cache
+from llm_cache import ResponseCache, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class EvictionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(llm_cache.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire_after_ttl(self):
+        cache = ResponseCache(ttl=60)
+        cache.put("k", "answer")
+        self.clock.now += 59
+        self.assertEqual(cache.get("k"), "answer")
+        self.clock.now += 2
+        self.assertIsNone(cache.get("k"))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_key_ignores_case_spacing_and_trailing_punctuation(self):
+        self.assertEqual(cache_key("m", "Status of  Alpha?", "ctx"), cache_key("m", "status of alpha", "ctx"))
+        self.assertNotEqual(cache_key("m", "status of alpha", "ctx"), cache_key("m", "status of alpha", "other"))
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_identical_calls_compute_once(self):
+        cache = ResponseCache()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        results = await asyncio.gather(*[cache.get_or_compute("k", compute) for _ in range(5)])
+        self.assertEqual(results, ["answer"] * 5)
+        self.assertEqual(calls, 1)
+        self.assertEqual((cache.hits, cache.misses), (4, 1))
+        self.assertEqual(await cache.get_or_compute("k", compute), "answer")
+        self.assertEqual(calls, 1)
+
+    async def test_leader_exception_reaches_waiters(self):
+        cache = ResponseCache()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            *[cache.get_or_compute("k", compute) for _ in range(3)], return_exceptions=True
+        )
+        self.assertEqual([str(r) for r in results], ["upstream down"] * 3)
+        self.assertEqual(calls, 1)
+        # Failures are not cached: the next call computes again
+        with self.assertRaises(RuntimeError):
+            await cache.get_or_compute("k", compute)
+        self.assertEqual(calls, 2)
+
+    async def test_cancelled_leader_hands_over_to_a_waiter(self):
+        cache = ResponseCache()
+        started = asyncio.Event()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            started.set()
+            await asyncio.sleep(0.05)
+            return f"answer {calls}"
+
+        leader = asyncio.create_task(cache.get_or_compute("k", compute))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await waiter, "answer 2")
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(cache._inflight, {})
+
+    async def test_none_results_are_shared_but_not_cached(self):
+        cache = ResponseCache()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return None
+
+        results = await asyncio.gather(*[cache.get_or_compute("k", compute) for _ in range(3)])
+        self.assertEqual(results, [None] * 3)
+        self.assertEqual(calls, 1)
+        self.assertIsNone(cache.get("k"))
+        await cache.get_or_compute("k", compute)
+        self.assertEqual(calls, 2)
+
+    async def test_streaming_leader_publishes_to_lookups(self):
+        cache = ResponseCache()
+        release = asyncio.Event()
+
+        async def stream():
+            with cache.lead("k") as publish:
+                await release.wait()
+                publish("streamed answer")
+
+        leader = asyncio.create_task(stream())
+        await asyncio.sleep(0)
+        lookups = [asyncio.create_task(cache.lookup("k")) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        await leader
+
+        self.assertEqual([await t for t in lookups], ["streamed answer"] * 3)
+        self.assertEqual(cache.get("k"), "streamed answer")
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    async def test_lead_left_without_result_lets_a_lookup_take_over(self):
+        cache = ResponseCache()
+
+        async def abandoned_stream():
+            with cache.lead("k"):
+                await asyncio.sleep(0.01)
+
+        leader = asyncio.create_task(abandoned_stream())
+        await asyncio.sleep(0)
+        lookup = asyncio.create_task(cache.lookup("k"))
+        await leader
+        # Nothing was published, so the caller has to compute it itself
+        self.assertIsNone(await lookup)
+        self.assertEqual(cache._inflight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
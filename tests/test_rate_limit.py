@@ -0,0 +1,290 @@
+"""Outbound rate limiting: token bucket, circuit breaker, priority gate and
+the retrying Upstream.request.
+
+Run from the repository root with `python -m unittest discover tests`.
+Rate-limited answers come from the Groq stand-in in benchmarks/fakes.py.
+"""
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import httpx
+
+import rate_limit
+from benchmarks.fakes import FakeServer, GroqHandler
+from rate_limit import (
+    BACKGROUND, INTERACTIVE, CircuitBreaker, CircuitOpenError, PriorityGate, TokenBucket, Upstream,
+    parse_duration,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ClockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(rate_limit.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TokenBucketTest(ClockTestCase):
+
+    def test_steady_rate_after_burst(self):
+        bucket = TokenBucket(rate=2, burst=2)
+        self.assertEqual([bucket.reserve() for _ in range(4)], [0, 0, 0.5, 1.0])
+
+    def test_retry_after_pauses(self):
+        bucket = TokenBucket()
+        bucket.update(httpx.Headers({"Retry-After": "3"}))
+        self.assertEqual(bucket.reserve(), 3)
+        self.clock.now += 3
+        self.assertEqual(bucket.reserve(), 0)
+
+    def test_exhausted_quota_pauses_until_reset(self):
+        bucket = TokenBucket()
+        bucket.update(httpx.Headers({
+            "X-RateLimit-Remaining-Requests": "5", "X-RateLimit-Reset-Requests": "1s",
+            "X-RateLimit-Remaining-Tokens": "0", "X-RateLimit-Reset-Tokens": "1m0.5s",
+        }))
+        self.assertEqual(bucket.reserve(), 60.5)
+
+    def test_remaining_requests_are_spent_before_waiting_for_reset(self):
+        bucket = TokenBucket()
+        bucket.update(httpx.Headers({"X-RateLimit-Remaining-Requests": "2", "X-RateLimit-Reset-Requests": "10s"}))
+        self.assertEqual([bucket.reserve() for _ in range(4)], [0, 0, 10, 0])
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("2m59.5s"), 179.5)
+        self.assertEqual(parse_duration("120ms"), 0.12)
+        self.assertEqual(parse_duration("7"), 7)
+        self.assertIsNone(parse_duration("soon"))
+        self.assertIsNone(parse_duration(None))
+
+
+class CircuitBreakerTest(ClockTestCase):
+
+    def open_breaker(self):
+        breaker = CircuitBreaker("test", failures=3, reset=30)
+        for _ in range(3):
+            breaker.check()
+            breaker.failure()
+        return breaker
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("test", failures=3, reset=30)
+        breaker.failure()
+        breaker.failure()
+        breaker.success()
+        breaker.failure()
+        breaker.failure()
+        breaker.check()
+        breaker.failure()
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.check()
+        self.assertEqual(raised.exception.retry_after, 30)
+
+    def test_half_open_admits_one_trial(self):
+        breaker = self.open_breaker()
+        self.clock.now += 30
+        breaker.check()
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+
+        # A failed trial reopens for a full reset period
+        breaker.failure()
+        self.clock.now += 29
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        self.clock.now += 1
+        breaker.check()
+
+        # A successful one closes it
+        breaker.success()
+        for _ in range(5):
+            breaker.check()
+
+    def test_trial_that_never_reports_expires(self):
+        breaker = self.open_breaker()
+        self.clock.now += 30
+        breaker.check()
+        self.clock.now += 29
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        self.clock.now += 1
+        breaker.check()
+
+
+class PriorityGateTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_interactive_waiters_go_first(self):
+        gate = PriorityGate(limit=1, background_limit=1)
+        admitted = []
+
+        async def worker(name, priority):
+            async with gate.slot(priority):
+                admitted.append(name)
+                await asyncio.sleep(0)
+
+        holder = gate.slot(INTERACTIVE)
+        await holder.__aenter__()
+        tasks = [
+            asyncio.create_task(worker("background", BACKGROUND)),
+            asyncio.create_task(worker("interactive 1", INTERACTIVE)),
+            asyncio.create_task(worker("interactive 2", INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        await holder.__aexit__(None, None, None)
+        await asyncio.gather(*tasks)
+        self.assertEqual(admitted, ["interactive 1", "interactive 2", "background"])
+
+    async def test_background_cap_keeps_slots_for_interactive(self):
+        gate = PriorityGate(limit=3, background_limit=1)
+        release = asyncio.Event()
+
+        async def worker(priority):
+            async with gate.slot(priority):
+                await release.wait()
+
+        background = [asyncio.create_task(worker(BACKGROUND)) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.assertEqual((gate._active, gate._active_background), (1, 1))
+
+        interactive = [asyncio.create_task(worker(INTERACTIVE)) for _ in range(2)]
+        await asyncio.sleep(0)
+        self.assertEqual((gate._active, gate._active_background), (3, 1))
+
+        release.set()
+        await asyncio.gather(*background, *interactive)
+        self.assertEqual((gate._active, gate._active_background, gate._waiters), (0, 0, []))
+
+    async def test_waiter_cancelled_right_after_admission_hands_slot_on(self):
+        gate = PriorityGate(limit=1, background_limit=1)
+        entered = []
+
+        async def worker(name):
+            async with gate.slot(INTERACTIVE):
+                entered.append(name)
+
+        holder = gate.slot(INTERACTIVE)
+        await holder.__aenter__()
+        first = asyncio.create_task(worker("first"))
+        second = asyncio.create_task(worker("second"))
+        await asyncio.sleep(0)
+        # The release admits `first`, which is cancelled before it gets to run
+        await holder.__aexit__(None, None, None)
+        first.cancel()
+
+        await asyncio.wait_for(second, timeout=1)
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        self.assertEqual(entered, ["second"])
+        self.assertEqual(gate._active, 0)
+
+
+def responses(*statuses):
+    """send() stub answering with the given statuses in turn"""
+    sent = []
+
+    async def send():
+        response = httpx.Response(statuses[len(sent)])
+        sent.append(response)
+        return response
+
+    return send, sent
+
+
+class UpstreamRequestTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        for name, value in (("_backoff", lambda attempt: 0), ("RETRY_ATTEMPTS", 2)):
+            patcher = mock.patch.object(rate_limit, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_retries_until_success(self):
+        upstream = Upstream("test")
+        send, sent = responses(503, 429, 200)
+        async with upstream.request(send) as response:
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(sent), 3)
+        self.assertTrue(all(r.is_closed for r in sent))
+        self.assertEqual(upstream.breaker._failures, 0)
+
+    async def test_last_response_is_yielded_when_retries_run_out(self):
+        upstream = Upstream("test")
+        send, sent = responses(503, 503, 503, 200)
+        async with upstream.request(send) as response:
+            self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(sent), 3)
+
+    async def test_slot_is_held_while_the_body_is_read(self):
+        upstream = Upstream("test", concurrency=1)
+        send, sent = responses(200)
+        async with upstream.request(send):
+            self.assertEqual(upstream.gate()._active, 1)
+        self.assertEqual(upstream.gate()._active, 0)
+        self.assertTrue(sent[0].is_closed)
+
+    async def test_slot_is_released_when_the_block_raises(self):
+        upstream = Upstream("test", concurrency=1)
+        send, sent = responses(200, 200)
+        with self.assertRaises(RuntimeError):
+            async with upstream.request(send):
+                raise RuntimeError("client went away")
+        self.assertEqual(upstream.gate()._active, 0)
+        self.assertTrue(sent[0].is_closed)
+        async with upstream.request(send) as response:
+            self.assertEqual(response.status_code, 200)
+
+    async def test_open_circuit_fails_fast(self):
+        upstream = Upstream("test")
+        upstream.breaker = CircuitBreaker("test", failures=1, reset=30)
+        calls = 0
+
+        async def send():
+            nonlocal calls
+            calls += 1
+            raise httpx.ConnectError("refused")
+
+        with mock.patch.object(rate_limit, "RETRY_ATTEMPTS", 0), self.assertRaises(httpx.ConnectError):
+            async with upstream.request(send):
+                pass
+        with self.assertRaises(CircuitOpenError):
+            async with upstream.request(send):
+                pass
+        self.assertEqual(calls, 1)
+
+
+class RateLimitedUpstreamTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = FakeServer(GroqHandler, error_rate=1.0).__enter__()
+        self.addCleanup(self.server.__exit__)
+        for name, value in (("_backoff", lambda attempt: 0), ("RETRY_ATTEMPTS", 1)):
+            patcher = mock.patch.object(rate_limit, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_retried_after_retry_after(self):
+        upstream = Upstream("groq")
+        async with httpx.AsyncClient(base_url=self.server.url) as client:
+            started = time.monotonic()
+            async with upstream.request(lambda: client.post("/chat/completions", json={})) as response:
+                self.assertEqual(response.status_code, 429)
+            elapsed = time.monotonic() - started
+        self.assertEqual(self.server.requests, 2)
+        # The fake answers with Retry-After: 1
+        self.assertGreaterEqual(elapsed, 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
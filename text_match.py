@@ -0,0 +1,72 @@
+from collections import deque
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed set of lowercase keywords.
+
+    Finds every keyword occurring as a substring of a text in a single pass,
+    independent of how many keywords were compiled in.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = []
+        ids = {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for keyword in keywords:
+            keyword = keyword.lower()
+            if not keyword or keyword in ids:
+                continue
+            ids[keyword] = len(self.keywords)
+            self._add(keyword, ids[keyword])
+            self.keywords.append(keyword)
+
+        self._build_failure_links()
+
+    def _add(self, keyword, keyword_id):
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(keyword_id)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter_matches(self, text):
+        """Yield (end_index, keyword_id) for every occurrence in text (already lowercased)"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for keyword_id in out[node]:
+                    yield i, keyword_id
+
+    def find(self, text):
+        """Distinct matched keywords, in the order they are found"""
+        seen = {}
+        for _, keyword_id in self.iter_matches(text):
+            if keyword_id not in seen:
+                seen[keyword_id] = None
+        return [self.keywords[k] for k in seen]
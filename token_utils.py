@@ -0,0 +1,37 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:  # fall back to the estimate below
+    tiktoken = None
+
+# Rough BPE-style token estimate: words split into ~4-character pieces,
+# punctuation counted one token per symbol.
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_encoding = None
+
+
+def _get_encoding():
+    # cl100k_base is close to Llama 3's tiktoken-based vocabulary; loading it
+    # can fail offline (the BPE file is fetched on first use), so it's optional
+    global _encoding, tiktoken
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            tiktoken = None
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    count = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        count += (len(piece) + 3) // 4 if piece[0].isalnum() or piece[0] == "_" else 1
+    return count
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
@@ -0,0 +1,131 @@
+import os
+import json
+import asyncio
+import httpx
+from metrics import inc
+from rate_limit import BACKGROUND, INTERACTIVE, Upstream
+
+# Shared outbound HTTP layer: one pooled keep-alive client per worker, and a
+# scheduler per upstream (rate limit, retries, circuit breaker, and for LLM
+# calls a priority-ordered cap on how many are in flight at once).
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_MODEL = "llama3-8b-8192"
+
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "60"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "50"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Slots background work (scope-doc summaries) may hold, so chats never wait behind it
+LLM_BACKGROUND_CONCURRENCY = int(os.getenv("LLM_BACKGROUND_CONCURRENCY", str(max(1, LLM_MAX_CONCURRENCY // 2))))
+
+# Steady client-side rates in requests per minute (0 = only what the
+# upstream's rate-limit headers and 429s ask for). Google defaults follow the
+# per-user read quotas of each API.
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "0"))
+GOOGLE_REQUESTS_PER_MINUTE = {
+    "sheets": float(os.getenv("SHEETS_REQUESTS_PER_MINUTE", "60")),
+    "drive": float(os.getenv("DRIVE_REQUESTS_PER_MINUTE", "1000")),
+    "docs": float(os.getenv("DOCS_REQUESTS_PER_MINUTE", "300")),
+}
+
+groq = Upstream(
+    "groq",
+    rate=GROQ_REQUESTS_PER_MINUTE / 60,
+    burst=LLM_MAX_CONCURRENCY,
+    concurrency=LLM_MAX_CONCURRENCY,
+    background_concurrency=LLM_BACKGROUND_CONCURRENCY,
+)
+# Quotas are per Google API, so each gets its own budget
+google_apis = {
+    name: Upstream(name, rate=per_minute / 60, burst=10)
+    for name, per_minute in GOOGLE_REQUESTS_PER_MINUTE.items()
+}
+
+_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_CONNECTIONS,
+                keepalive_expiry=30,
+            ),
+        )
+    return _client
+
+
+def groq_headers(api_key: str) -> dict:
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+
+async def post_chat_completion(payload: dict, api_key: str, priority: int = INTERACTIVE) -> httpx.Response:
+    """POST an OpenAI-compatible chat completion to Groq; the caller checks the status.
+
+    Rate limits and transient failures are retried; raises CircuitOpenError
+    while Groq keeps failing.
+    """
+    client = get_client()
+
+    async def send():
+        inc("upstream_requests_total", upstream="groq")
+        return await client.post(GROQ_API_URL, headers=groq_headers(api_key), json=payload)
+
+    async with groq.request(send, priority) as response:
+        return response
+
+
+async def stream_chat_completion(payload: dict, api_key: str, priority: int = INTERACTIVE):
+    """Yield content deltas from a streamed (`stream: true`) Groq chat completion.
+
+    Raises httpx.HTTPStatusError on a non-2xx reply (after retries) and
+    CircuitOpenError while Groq keeps failing. Closing or cancelling the
+    generator closes the upstream response.
+    """
+    client = get_client()
+
+    async def send():
+        inc("upstream_requests_total", upstream="groq")
+        request = client.build_request(
+            "POST", GROQ_API_URL, headers=groq_headers(api_key), json={**payload, "stream": True}
+        )
+        return await client.send(request, stream=True)
+
+    async with groq.request(send, priority) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            response.raise_for_status()
+
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            content = choices[0].get("delta", {}).get("content")
+            if content:
+                yield content
+
+
+def google_call(api: str, request):
+    """Execute a googleapiclient request under that API's rate limit and retry policy (blocking)"""
+    return google_apis[api].call(request.execute)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call (e.g. googleapiclient execute()) off the event loop"""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None